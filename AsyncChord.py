@@ -0,0 +1,704 @@
+import asyncio
+import os
+import time
+import xmlrpc.client
+import Pool
+import Store
+import Wire
+from Ring import m, nodes, hashFunction, is_between, vnode_id
+
+# asyncio Chord node. Maintenance and serving run as independent tasks on one event loop,
+# so a slow peer only delays the task waiting on it. Speaks the binary protocol from Wire.py,
+# which Client.py and Chord.py nodes use by default.
+#
+# One process (a Host) can hold several ring positions (virtual nodes) that share its server,
+# store and connection pool. Each frame names the position it is for.
+#
+# These nodes can share a ring with Chord.py nodes: they serve every RPC a Chord.py node calls on
+# its peers. They do not take part in load balancing, though. notify returns no load statistics,
+# so a Chord.py neighbour never tries to move into a range held here.
+
+# Virtual node settings
+virtual_nodes = int(os.environ.get("CHORD_VNODES", 1))  # Ring positions hosted by this process; scale with its capacity
+
+# Lookup settings
+max_hops = 32  # Give up on a lookup after this many hops
+lookup_deadline = 2  # Seconds a lookup served to another node may take; Chord.py nodes pass their own budget
+
+# Failure recovery settings
+successor_list_size = 4  # r: backup successors kept for failover
+
+# Maintenance settings, in seconds
+stabilize_interval = 1
+fix_fingers_interval = 1
+check_predecessor_interval = 2
+report_interval = 5
+fingers_per_tick = 4  # Finger lookups per fix_fingers pass
+
+# Key handoff settings
+handoff_chunk_size = 500  # Entries per chunk when a range moves on join or leave
+handoff_timeout = 120  # Seconds without a chunk moving after which a handoff is abandoned and its writes dropped
+
+# Server settings
+max_connections = 64  # Outgoing connections per peer; further calls wait for a free one
+request_queue_size = 1024  # Pending connections before the OS starts refusing
+rpc_timeout = Pool.rpc_timeout  # Seconds to wait on a single outgoing RPC
+keepalive_timeout = 5  # Seconds an idle incoming connection is kept open
+
+class AsyncPool:
+    """Keeps idle binary-protocol connections per peer for asyncio callers."""
+
+    def __init__(self, size=Pool.pool_size, idle=Pool.idle_timeout, timeout=rpc_timeout, limit=max_connections):
+        self.size = size
+        self.idle = idle
+        self.timeout = timeout
+        self.limit = limit
+        self.idle_conns = {}  # (ip, port) -> [(reader, writer, last_used), ...]
+        self.slots = {}  # (ip, port) -> semaphore bounding the open connections to that peer
+
+    async def open(self, peer):
+        reader, writer = await asyncio.open_connection(peer[0], int(peer[1]))
+        writer.write(Wire.MAGIC)
+        return reader, writer
+
+    async def request(self, conn, method, args, target=None):
+        reader, writer = conn
+        payload = Wire.encode([method, list(args), target], bytearray())
+        writer.write(Wire.U32.pack(len(payload)) + payload)
+        await writer.drain()
+        reply = await read_frame(reader)
+        if reply[0] == 'fault':
+            raise xmlrpc.client.Fault(reply[1], reply[2])
+        return reply[1]
+
+    async def call(self, node, method, *args):
+        """Calls a method on the node, failing with asyncio.TimeoutError after self.timeout seconds."""
+        peer = (node['ip'], str(node['port']))
+        slots = self.slots.get(peer)
+        if slots is None:
+            slots = self.slots[peer] = asyncio.Semaphore(self.limit)
+        async with slots:
+            return await self.call_slot(peer, method, args, node.get('node_id'))
+
+    async def call_slot(self, peer, method, args, target):
+        conn = self.acquire(peer)
+        try:
+            if conn is None:
+                conn = await asyncio.wait_for(self.open(peer), self.timeout)
+            result = await asyncio.wait_for(self.request(conn, method, args, target), self.timeout)
+        except xmlrpc.client.Fault:
+            # The peer answered with an application error; the connection is still good
+            self.release(peer, conn)
+            raise
+        except BaseException:
+            # Includes cancellation: a half-finished exchange leaves the stream unusable
+            if conn is not None:
+                conn[1].close()
+            self.invalidate(peer)
+            raise
+        self.release(peer, conn)
+        return result
+
+    def acquire(self, peer):
+        now = time.monotonic()
+        idle = self.idle_conns.get(peer, [])
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if now - last_used <= self.idle:
+                return reader, writer
+            writer.close()
+        return None
+
+    def release(self, peer, conn):
+        idle = self.idle_conns.setdefault(peer, [])
+        if len(idle) < self.size:
+            idle.append((conn[0], conn[1], time.monotonic()))
+        else:
+            conn[1].close()
+
+    def invalidate(self, peer):
+        for _, writer, _ in self.idle_conns.pop(peer, []):
+            writer.close()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for peer in list(self.idle_conns):
+            fresh = []
+            for reader, writer, last_used in self.idle_conns[peer]:
+                if now - last_used <= self.idle:
+                    fresh.append((reader, writer, last_used))
+                else:
+                    writer.close()
+            if fresh:
+                self.idle_conns[peer] = fresh
+            else:
+                del self.idle_conns[peer]
+
+async def read_frame(reader):
+    size = Wire.U32.unpack(await reader.readexactly(4))[0]
+    if size > Wire.max_frame_size:
+        raise ValueError(f"Frame of {size} bytes exceeds max_frame_size")
+    return Wire.loads(await reader.readexactly(size))
+
+class ChordNode:
+    """One ring position. Its state is only touched from the event loop, so it needs no lock."""
+
+    def __init__(self, host, index=0):
+        self.host = host
+        self.ip = host.ip
+        self.port = host.port
+        self.node_id = vnode_id(self.ip, self.port, index)
+        self.me = {'node_id': self.node_id, 'ip': self.ip, 'port': self.port}
+        self.successor = self.me
+        self.predecessor = None
+        self.finger_table = [self.me for _ in range(m)]
+        self.successor_list = []  # The next r live nodes after this one, successor first
+        self.next = 0  # Next finger fix_fingers refreshes
+        self.store = host.store  # Shared with the other positions on this host; their ranges never overlap
+        self.handoffs = {}  # Receiving node_id -> range being handed over, and writes to it since the handoff began
+
+    # Routing
+
+    def find_next_hop(self, key, exclude=None, original_key=None):
+        """Answers a single step of an iterative lookup for the given key, avoiding the excluded node IDs.
+
+        original_key is accepted for compatibility with Chord.py; this node keeps no path cache.
+        """
+        excluded = set(exclude or [])
+        succ = self.successor
+        if succ['node_id'] in excluded:
+            # The caller saw our successor fail; the first live backup takes over its range
+            live = [s for s in self.successor_list if s['node_id'] not in excluded]
+            succ = live[0] if live else self.me
+        if succ['node_id'] == self.node_id or is_between(key, self.node_id, succ['node_id'], nodes):
+            return {'done': True, 'node': succ, 'successor': succ, 'self': self.me}
+
+        n_prime = self.closest_preceding_node(key, excluded)
+        if n_prime['node_id'] == self.node_id:
+            return {'done': True, 'node': succ, 'successor': succ, 'self': self.me}
+        return {'done': False, 'node': n_prime, 'successor': succ, 'self': self.me}
+
+    def closest_preceding_node(self, key, exclude=()):
+        """Finds the closest preceding node to the given key among the fingers and the successor list."""
+        best = None
+        for candidate in self.finger_table + self.successor_list:
+            if candidate['node_id'] == self.node_id or candidate['node_id'] in exclude:
+                continue
+            if not is_between(candidate['node_id'], self.node_id, key, nodes):
+                continue
+            if best is None or (candidate['node_id'] - self.node_id) % nodes > (best['node_id'] - self.node_id) % nodes:
+                best = candidate
+        return best or self.me
+
+    async def find_successor(self, key, budget=None):
+        """Answers a lookup for another node, giving up after budget seconds (lookup_deadline by default).
+
+        Takes the same arguments as Chord.py's find_successor, so either kind of node can ask.
+        """
+        try:
+            return await asyncio.wait_for(self.lookup(key), lookup_deadline if budget is None else budget)
+        except asyncio.TimeoutError:
+            print(f"Lookup for key {key} missed its deadline")
+            return None
+
+    async def lookup(self, key, start=None):
+        """Finds the successor of a key by driving the hops from this node, starting at start if given."""
+        responder = None if start is None or start['node_id'] == self.node_id else start
+        exclude = []
+
+        async def ask(node):
+            if node is None:
+                return self.find_next_hop(key, exclude)
+            return await self.host.call(node, 'find_next_hop', key, exclude)
+
+        try:
+            hop = await ask(responder)
+        except Exception as e:
+            print(f"Node {start['node_id']} is not responding: {e!r}")
+            return None
+        hops = 1
+        while not hop['done']:
+            if hops >= max_hops:
+                print(f"Lookup for key {key} gave up after {hops} hops")
+                return None
+            n_prime = hop['node']
+            try:
+                hop = await ask(n_prime)
+                responder = n_prime
+            except Exception as e:
+                # Route around the dead node by asking the last live hop again without it
+                print(f"Node {n_prime['node_id']} is not responding: {e!r}")
+                exclude.append(n_prime['node_id'])
+                self.forget_node(n_prime['node_id'])
+                try:
+                    hop = await ask(responder)
+                except Exception as e:
+                    print(f"Lookup for key {key} lost its previous hop: {e!r}")
+                    return None
+            hops += 1
+        return hop['node']
+
+    def forget_node(self, dead_id):
+        """Drops a node that stopped responding from the successor list and the finger table."""
+        self.successor_list = [s for s in self.successor_list if s['node_id'] != dead_id]
+        if self.successor['node_id'] == dead_id:
+            self.successor = self.successor_list[0] if self.successor_list else self.me
+            print(f"Successor Node {dead_id} failed, failing over to Node {self.successor['node_id']}")
+        self.finger_table = [self.successor if f['node_id'] == dead_id else f for f in self.finger_table]
+
+    def get_successor_list(self):
+        """Returns the successor followed by its backups."""
+        return list(self.successor_list) or [self.successor]
+
+    def get_successor(self):
+        return self.successor
+
+    def get_predecessor(self):
+        return self.predecessor
+
+    def get_finger_table(self):
+        """Returns the finger table so a joining Chord.py node can start from it."""
+        return list(self.finger_table)
+
+    # Ring maintenance
+
+    async def join(self, n_prime):
+        """Joins the ring through the given node and pulls our range from the new successor."""
+        print(f"Node {self.node_id} trying to join via Node {n_prime['node_id']}")
+        x = await self.lookup(self.node_id, n_prime)
+        if x is None:
+            print(f"Failed to join: no successor found for Node {self.node_id}")
+            return
+        self.successor = x
+        print(f"Node {self.node_id} joined the network. Successor is now Node {x['node_id']}")
+        if x['node_id'] != self.node_id:
+            await self.pull_handoff(x)
+
+    async def stabilize(self):
+        """Checks our successor's predecessor, notifies the successor and refreshes the successor list."""
+        while True:
+            succ = self.successor
+            if succ['node_id'] == self.node_id:
+                x = self.predecessor
+                break
+            try:
+                x = await self.host.call(succ, 'get_predecessor')
+                break
+            except Exception as e:
+                print(f"Successor Node {succ['node_id']} is not responding: {e!r}")
+                self.forget_node(succ['node_id'])
+        if x is not None and x['node_id'] != self.node_id and is_between(x['node_id'], self.node_id, succ['node_id'], nodes):
+            # Our successor may still list a crashed predecessor; don't fail back onto it
+            try:
+                await self.host.call(x, 'get_predecessor')
+            except Exception as e:
+                print(f"Ignoring unresponsive Node {x['node_id']} as successor: {e!r}")
+                x = None
+        if x is not None and x['node_id'] != self.node_id and (
+                self.successor['node_id'] == self.node_id or
+                is_between(x['node_id'], self.node_id, self.successor['node_id'], nodes)):
+            print(f"Updating successor to Node {x['node_id']}")
+            self.successor = x
+
+        succ = self.successor
+        if succ['node_id'] == self.node_id:
+            return
+        await self.host.call(succ, 'notify', self.me)
+        # Our backups are our successor and the first r - 1 of its backups
+        backups = [succ] + await self.host.call(succ, 'get_successor_list')
+        self.successor_list = [s for s in backups if s['node_id'] != self.node_id][:successor_list_size]
+
+    def notify(self, n_prime, load=None):
+        """Accepts n_prime as predecessor if it is closer than the current one.
+
+        load is accepted for compatibility with Chord.py; these nodes do not rebalance.
+        """
+        if n_prime['node_id'] == self.node_id:
+            return
+        pred = self.predecessor
+        if pred is None or is_between(n_prime['node_id'], pred['node_id'], self.node_id, nodes):
+            print(f"Updating predecessor to Node {n_prime['node_id']}")
+            self.predecessor = n_prime
+
+    async def check_predecessor(self):
+        """Clears the predecessor if it stopped answering, so a live node can claim the slot."""
+        pred = self.predecessor
+        if pred is None:
+            return
+        try:
+            await self.host.call(pred, 'get_successor')
+        except Exception as e:
+            print(f"Predecessor Node {pred['node_id']} is not responding: {e!r}")
+            if self.predecessor is pred:
+                self.predecessor = None
+
+    async def fix_fingers(self):
+        """Refreshes the finger table round-robin, spending at most fingers_per_tick lookups per call."""
+        lookups = 0
+        for _ in range(m):
+            i = self.next
+            start = (self.node_id + 2 ** i) % nodes
+            previous = self.successor if i == 0 else self.finger_table[i - 1]
+            if i == 0 or is_between(start, self.node_id, previous['node_id'], nodes):
+                # The previous finger already covers this start, no lookup needed
+                finger = previous
+            elif lookups < fingers_per_tick:
+                finger = await self.lookup(start)
+                lookups += 1
+            else:
+                break
+            self.next = (self.next + 1) % m
+            if finger is not None:
+                self.finger_table[i] = finger
+
+    def report(self):
+        fingers = self.finger_table
+        for i in range(m):
+            # Most fingers repeat in a sparse ring; print only where the table changes
+            if i == 0 or fingers[i]['node_id'] != fingers[i - 1]['node_id']:
+                print(f"{i} {fingers[i]['node_id']}")
+        start = self.predecessor['node_id'] if self.predecessor else self.node_id
+        owned = sum(hi - lo for lo, hi in self.store.spans(start, self.node_id))
+        print(f"Node {self.node_id} owns {owned} buckets")
+        print(f"Predecessor of Node {self.node_id}: {self.predecessor}")
+        print(f"Successor of Node {self.node_id}: {self.successor}")
+        print("--------------------")
+
+    async def every(self, interval, step):
+        """Runs step every interval seconds until cancelled. A failed pass is logged and retried next time."""
+        while True:
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{step.__name__} failed: {e!r}")
+            await asyncio.sleep(interval)
+
+    # Data
+
+    def owns(self, key):
+        """Checks whether the key falls in this node's range. Without a predecessor it cannot tell, so it accepts.
+
+        A range we are still handing over stays ours until the handoff commits.
+        """
+        pred = self.predecessor
+        moving = any(is_between(key, h['start'], h['end'], nodes) for h in self.handoffs.values())
+        return pred is None or moving or is_between(key, pred['node_id'], self.node_id, nodes)
+
+    def store_entry(self, key_hash, key, value, version=None):
+        """Stores a key under a new version, or under the given one for a copy sent by another node.
+
+        A copy older than the version we already hold is ignored.
+        """
+        if version is None:
+            version = self.host.last_version = max(time.time_ns(), self.host.last_version + 1)
+        elif self.host.versions.get((key_hash, key), 0) >= version:
+            return
+        else:
+            self.host.last_version = max(self.host.last_version, version)
+        self.store.put(key_hash, key, value)
+        self.host.versions[(key_hash, key)] = version
+        for h in self.handoffs.values():
+            if is_between(key_hash, h['start'], h['end'], nodes):
+                h['dirty'][(key_hash, key)] = (value, version)
+
+    def entry_version(self, key_hash, key):
+        return self.host.versions.get((key_hash, key), self.host.boot_version)
+
+    def entries(self, start, end, limit=None):
+        """Returns our [hash, key, value, version] entries in (start, end]."""
+        return [[k, key, v, self.entry_version(k, key)] for k, key, v in self.store.scan(start, end, limit)]
+
+    def put(self, key_hash, key, value):
+        if not self.owns(key_hash):
+            raise xmlrpc.client.Fault(Pool.WRONG_OWNER, f"Node {self.node_id} does not own key {key_hash}")
+        self.store_entry(key_hash, key, value)
+        return self.host.versions[(key_hash, key)]
+
+    def get(self, key_hash, key):
+        if not self.owns(key_hash):
+            raise xmlrpc.client.Fault(Pool.WRONG_OWNER, f"Node {self.node_id} does not own key {key_hash}")
+        if not self.store.contains(key_hash, key):
+            raise KeyError(key)
+        return self.store.get(key_hash, key)
+
+    def get_versioned(self, key_hash, key):
+        """Returns a key we own as {'value', 'version'}."""
+        value = self.get(key_hash, key)
+        return {'value': value, 'version': self.entry_version(key_hash, key)}
+
+    def get_version(self, key_hash, key):
+        """Returns the version of a key we own without its value, or None if it is missing."""
+        if not self.owns(key_hash):
+            raise xmlrpc.client.Fault(Pool.WRONG_OWNER, f"Node {self.node_id} does not own key {key_hash}")
+        if not self.store.contains(key_hash, key):
+            return None
+        return self.entry_version(key_hash, key)
+
+    def cache_put(self, key_hash, key, value, version):
+        """These nodes keep no path cache, so the copy is never kept."""
+        return False
+
+    def put_many(self, items):
+        """Stores a batch of [hash, key, value] entries. Returns the hashes that belong to another node."""
+        misrouted = [key_hash for key_hash, _, _ in items if not self.owns(key_hash)]
+        rejected = set(misrouted)
+        for key_hash, key, value in items:
+            if key_hash not in rejected:
+                self.store_entry(key_hash, key, value)
+        return misrouted
+
+    def get_many(self, keys):
+        """Retrieves a batch of [hash, key] entries. Missing keys map to None; hashes owned by another node are reported as misrouted."""
+        misrouted = [key_hash for key_hash, _ in keys if not self.owns(key_hash)]
+        return {'values': [self.store.get(key_hash, key) for key_hash, key in keys], 'misrouted': misrouted}
+
+    def get_replica(self, key_hash, key):
+        """Returns our copy of a key with our load. This node keeps no replicas, so only the owner answers."""
+        return {'value': self.store.get(key_hash, key), 'load': self.host.inflight}
+
+    def get_replicas(self):
+        return [self.me]
+
+    def get_stats(self):
+        """Returns counters for benchmarks: calls served by this host, calls in flight and keys stored."""
+        return {'served': self.host.served, 'inflight': self.host.inflight, 'keys': len(self.store)}
+
+    def replicate_many(self, entries):
+        """Stores [hash, key, value, version] entries pushed to us, without an ownership check."""
+        for entry in entries:
+            self.store_entry(*entry)
+        return True
+
+    def suc_update(self, node):
+        self.successor = node
+        return True
+
+    def pred_update(self, node):
+        self.predecessor = node
+        return True
+
+    # Key handoff
+
+    def scan_range(self, start, end, limit=1000):
+        """Returns about limit [hash, key, value, version] entries with hashes in (start, end], in ring order from start."""
+        self.touch_handoffs(end)
+        entries = self.entries(start, end, limit)
+        if len(entries) < limit or entries[-1][0] == end:
+            return {'entries': entries, 'next': None}
+        return {'entries': entries, 'next': entries[-1][0]}
+
+    def begin_handoff(self, receiver):
+        """Starts handing our part of (predecessor, receiver] to a joining node. Repeat calls resume the same handoff.
+
+        Returns None if the receiver does not split our range, e.g. it already is our predecessor.
+        """
+        h = self.handoffs.get(receiver['node_id'])
+        if h is None:
+            start = self.predecessor['node_id'] if self.predecessor else self.node_id
+            if receiver['node_id'] in (start, self.node_id) or \
+                    not is_between(receiver['node_id'], start, self.node_id, nodes):
+                return None
+            h = {'node': receiver, 'start': start, 'end': receiver['node_id'], 'dirty': {}}
+            self.handoffs[receiver['node_id']] = h
+            print(f"Handing keys in ({h['start']}, {h['end']}] to Node {receiver['node_id']}")
+        h['active'] = time.monotonic()
+        return {'start': h['start'], 'end': h['end']}
+
+    def touch_handoffs(self, end):
+        """Marks the handoffs of ranges ending at end as still moving."""
+        now = time.monotonic()
+        for h in self.handoffs.values():
+            if h['end'] == end:
+                h['active'] = now
+
+    def expire_handoffs(self):
+        """Drops handoffs that have not moved a chunk for handoff_timeout, such as one whose receiver crashed mid-join."""
+        now = time.monotonic()
+        for receiver_id in [r for r, h in self.handoffs.items() if now - h['active'] > handoff_timeout]:
+            h = self.handoffs.pop(receiver_id)
+            print(f"Abandoning handoff of ({h['start']}, {h['end']}] to Node {receiver_id} "
+                  f"({len(h['dirty'])} late writes dropped)")
+
+    def commit_handoff(self, receiver_id):
+        """Finishes a handoff and drops the range. Returns the writes made to it while it was being copied."""
+        h = self.handoffs.pop(receiver_id, None)
+        if h is None:
+            return []
+        self.store.pop_range(h['start'], h['end'])
+        return [[key_hash, key, value, version] for (key_hash, key), (value, version) in h['dirty'].items()]
+
+    async def pull_handoff(self, source):
+        """Copies our range from the source in chunks, then commits."""
+        if self.host.local(source) is not None:
+            # A position on this host already holds the keys in our shared store
+            return
+        rng = await self.host.call(source, 'begin_handoff', self.me)
+        if rng is None:
+            return
+        cursor = rng['start']
+        moved = 0
+        while cursor is not None:
+            page = await self.host.call(source, 'scan_range', cursor, rng['end'], handoff_chunk_size)
+            for entry in page['entries']:
+                self.store_entry(*entry)
+            moved += len(page['entries'])
+            cursor = page['next']
+        delta = await self.host.call(source, 'commit_handoff', self.node_id)
+        for entry in delta:
+            self.store_entry(*entry)
+        print(f"Transferred {moved + len(delta)} keys from Node {source['node_id']}")
+
+    async def leave(self, last=None):
+        """Hands our keys to the successor, then links our neighbours to each other.
+
+        Given last, a sibling later in a run of adjacent positions on this host, the run leaves as one
+        range: (our predecessor, last] goes to last's successor.
+        """
+        last = last or self
+        pred, succ = self.predecessor, last.successor
+        if succ['node_id'] != self.node_id and self.host.local(succ) is None:
+            start = pred['node_id'] if pred else self.node_id
+            entries = self.entries(start, last.node_id)
+            for i in range(0, len(entries), handoff_chunk_size):
+                await self.host.call(succ, 'replicate_many', entries[i:i + handoff_chunk_size])
+            print(f"Handed {len(entries)} keys to Node {succ['node_id']}")
+            await self.host.call(succ, 'pred_update', pred)
+        if pred is not None:
+            await self.host.call(pred, 'suc_update', succ)
+
+class Host:
+    """A process serving one or more ring positions behind a single server, store and connection pool."""
+
+    def __init__(self, ip, port, count=virtual_nodes, storage_engine="memory", path=None):
+        self.ip = ip
+        self.port = str(port)
+        self.store = Store.open_store(storage_engine, path)
+        # Write versions for caches; keys written before this start report boot_version
+        self.boot_version = time.time_ns()
+        self.last_version = self.boot_version
+        self.versions = {}  # (hash, key) -> version of the last write accepted here
+        self.pool = AsyncPool()
+        self.inflight = 0  # Calls being dispatched right now, reported to clients as load
+        self.served = 0  # Calls dispatched since startup
+        self.tasks = []
+        self.vnodes = {}  # node_id -> ChordNode, in creation order
+        for index in range(count):
+            node = ChordNode(self, index)
+            self.vnodes[node.node_id] = node
+        self.first = next(iter(self.vnodes.values()))  # Answers frames that name no position, such as XML-RPC-era callers
+
+    def local(self, node):
+        """Returns our ChordNode for a node reference, or None if it lives elsewhere."""
+        if node['ip'] != self.ip or str(node['port']) != self.port:
+            return None
+        return self.vnodes.get(node.get('node_id'))
+
+    async def call(self, node, method, *args):
+        """Calls a method on a node, skipping the network when it is one of our own positions."""
+        local = self.local(node)
+        if local is not None:
+            return await self.invoke(local, method, args)
+        return await self.pool.call(node, method, *args)
+
+    async def invoke(self, node, method, params):
+        if method == 'hashFunction':
+            return hashFunction(*params)
+        if method.startswith('_') or method not in rpc_methods:
+            raise Exception(f'method "{method}" is not supported')
+        self.inflight += 1
+        self.served += 1
+        try:
+            result = getattr(node, method)(*params)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+        finally:
+            self.inflight -= 1
+
+    async def serve_connection(self, reader, writer):
+        """Answers binary requests on one connection until the peer closes it or goes idle."""
+        try:
+            if await asyncio.wait_for(reader.readexactly(len(Wire.MAGIC)), keepalive_timeout) != Wire.MAGIC:
+                return
+            while True:
+                request = await asyncio.wait_for(read_frame(reader), keepalive_timeout)
+                method, params, target = Wire.parse_request(request)
+                try:
+                    reply = ['ok', await self.invoke(self.vnodes.get(target, self.first), method, params)]
+                except xmlrpc.client.Fault as fault:
+                    reply = ['fault', fault.faultCode, fault.faultString]
+                except Exception as e:
+                    reply = ['fault', 1, f"{type(e)}:{e}"]
+                payload = Wire.encode(reply, bytearray())
+                writer.write(Wire.U32.pack(len(payload)) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def report(self):
+        for node in self.vnodes.values():
+            node.report()
+            node.expire_handoffs()
+        print(f"{len(self.vnodes)} positions, {len(self.store)} keys stored, {self.inflight} calls in flight")
+        print("--------------------")
+        self.pool.evict_idle()
+
+    async def run(self, bootstrap=None):
+        """Serves requests and runs every position's maintenance tasks until cancelled."""
+        server = await asyncio.start_server(self.serve_connection, self.ip, int(self.port), backlog=request_queue_size)
+        print(f"Host {self.ip}:{self.port} listening with {len(self.vnodes)} positions: {list(self.vnodes)}")
+        for node in self.vnodes.values():
+            if bootstrap is not None:
+                await node.join(bootstrap)
+            else:
+                # Starting a new ring: the other positions join through the first
+                bootstrap = node.me
+            for interval, step in ((stabilize_interval, node.stabilize),
+                                   (fix_fingers_interval, node.fix_fingers),
+                                   (check_predecessor_interval, node.check_predecessor)):
+                self.tasks.append(asyncio.create_task(node.every(interval, step)))
+        self.tasks.append(asyncio.create_task(self.first.every(report_interval, self.report)))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in self.tasks:
+                task.cancel()
+
+    async def leave(self):
+        """Leaves the ring, one run of adjacent positions at a time.
+
+        A position whose successor is a sibling has no remote node to hand its keys to, so the run's first
+        position hands over the whole run.
+        """
+        self.pool = AsyncPool()  # The old connections belong to the stopped event loop
+        for node in self.vnodes.values():
+            if node.predecessor is not None and self.local(node.predecessor) is not None:
+                continue  # Not the first position of its run
+            last = node
+            while True:
+                sibling = self.local(last.successor)
+                if sibling is None or sibling is node:
+                    break
+                last = sibling
+            await node.leave(last)
+
+# Methods of ChordNode callable over the wire
+rpc_methods = {'find_successor', 'find_next_hop', 'get_predecessor', 'get_successor', 'get_successor_list', 'get_finger_table',
+               'notify', 'put', 'get', 'put_many', 'get_many', 'get_replica', 'get_replicas', 'get_stats',
+               'get_versioned', 'get_version', 'cache_put', 'replicate_many', 'suc_update', 'pred_update', 'scan_range', 'begin_handoff', 'commit_handoff'}
+
+if __name__ == '__main__':
+    port = input("Enter port number: ")
+    host = Host("localhost", port)
+    bootstrap = None if port == "3000" else {'node_id': 3000, 'ip': 'localhost', 'port': '3000'}
+    try:
+        asyncio.run(host.run(bootstrap))
+    except KeyboardInterrupt:
+        asyncio.run(host.leave())
+        host.store.close()
+        print("Exiting...")
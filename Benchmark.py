@@ -0,0 +1,248 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+import Pool
+from Ring import hashFunction
+
+# Benchmarks a local ring: starts N nodes on ports 3000.., then times find_successor, put and get
+# at a fixed concurrency over uniform or Zipfian keys. Results are written as JSON so runs of two
+# versions can be compared with --compare.
+#
+#   python Benchmark.py --nodes 5 --ops 2000 --concurrency 16 --dist zipf --output results.json
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+base_port = 3000  # Nodes bootstrap through port 3000, see Chord.py's user_input_loop
+
+def start_ring(count, script, workdir):
+    """Starts count nodes, each with its own log file in workdir. Returns the processes and node references."""
+    procs = []
+    peers = []
+    for i in range(count):
+        port = str(base_port + i)
+        log = open(os.path.join(workdir, f"node-{port}.log"), "w")
+        proc = subprocess.Popen([sys.executable, "-u", os.path.join(repo_dir, script)], cwd=workdir,
+                                stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        proc.stdin.write(f"{port}\n".encode())
+        proc.stdin.close()
+        procs.append(proc)
+        peers.append({'ip': 'localhost', 'port': port})
+        time.sleep(1)  # Let each node join before the next one starts
+    return procs, peers
+
+def stop_ring(procs):
+    for proc in procs:
+        proc.send_signal(signal.SIGTERM)
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def ring_size(entry, limit):
+    """Walks successor pointers from entry and counts the distinct nodes seen."""
+    seen = set()
+    node = Pool.connect(entry).get_successor()
+    while node['node_id'] not in seen and len(seen) < limit:
+        seen.add(node['node_id'])
+        node = Pool.connect(node).get_successor()
+    return len(seen)
+
+def wait_for_ring(peers, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if ring_size(peers[0], len(peers) + 1) == len(peers):
+                return True
+        except Exception:
+            pass
+        time.sleep(1)
+    return False
+
+def walk(entry, key_hash, max_hops=32):
+    """Resolves a key's owner with find_next_hop from entry. Returns (owner, hops)."""
+    hop = Pool.connect(entry).find_next_hop(key_hash, [])
+    hops = 1
+    while not hop['done'] and hops < max_hops:
+        hop = Pool.connect(hop['node']).find_next_hop(key_hash, [])
+        hops += 1
+    return hop['node'], hops
+
+class Keys:
+    """Draws keys from a fixed key space, uniformly or with Zipfian popularity."""
+
+    def __init__(self, count, dist, skew, rng):
+        self.keys = [f"bench-{i}" for i in range(count)]
+        self.hashes = [hashFunction(key) for key in self.keys]
+        self.rng = rng
+        self.cumulative = None
+        if dist == "zipf":
+            total = 0
+            self.cumulative = []
+            for rank in range(1, count + 1):
+                total += 1 / rank ** skew
+                self.cumulative.append(total)
+
+    def draw(self):
+        if self.cumulative is None:
+            i = self.rng.randrange(len(self.keys))
+        else:
+            i = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.keys[i], self.hashes[i]
+
+def run_phase(name, op, args_list, concurrency):
+    """Runs op over args_list on concurrency threads. Returns latency and throughput figures."""
+    latencies = []
+    hops = []
+    errors = 0
+
+    def timed(args):
+        started = time.perf_counter()
+        try:
+            result = op(*args)
+        except (OSError, xmlrpc.client.Error):
+            return None, None
+        return time.perf_counter() - started, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, result in executor.map(timed, args_list):
+            if latency is None:
+                errors += 1
+                continue
+            latencies.append(latency)
+            if result is not None:
+                hops.append(result)
+    elapsed = time.perf_counter() - started
+    summary = {
+        'ops': len(latencies),
+        'errors': errors,
+        'ops_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+    if hops:
+        summary['hops_mean'] = statistics.mean(hops)
+        summary['hops_p99'] = percentile(hops, 99)
+    print(f"{name}: {summary['ops']} ops, {summary['ops_per_sec']:.0f} ops/s, "
+          f"p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms, {errors} errors")
+    return summary
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+def background_rate(peers, seconds):
+    """Measures the RPCs per second the ring serves with no client load, i.e. stabilize_loop traffic."""
+    def served():
+        return sum(Pool.connect(peer).get_stats()['served'] for peer in peers)
+
+    before = served()
+    time.sleep(seconds)
+    after = served()
+    # Discount the get_stats calls of the first sample, which are counted in the second
+    return (after - before - len(peers)) / seconds
+
+def compare(results, baseline_path):
+    """Prints how each figure moved relative to a previous run's results."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    for phase, figures in results.items():
+        if not isinstance(figures, dict) or phase not in baseline:
+            continue
+        for name in ('ops_per_sec', 'p50_ms', 'p99_ms', 'hops_mean'):
+            if name in figures and baseline[phase].get(name):
+                change = (figures[name] - baseline[phase][name]) / baseline[phase][name]
+                print(f"{phase}.{name}: {baseline[phase][name]:.2f} -> {figures[name]:.2f} ({change:+.1%})")
+    if 'background_rpcs_per_sec' in baseline:
+        print(f"background_rpcs_per_sec: {baseline['background_rpcs_per_sec']:.1f} -> "
+              f"{results['background_rpcs_per_sec']:.1f}")
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main(args):
+    rng = random.Random(args.seed)
+    keys = Keys(args.keys, args.dist, args.skew, rng)
+    workdir = tempfile.mkdtemp(prefix="chord-bench-")
+    print(f"Starting {args.nodes} nodes of {args.script}, logs in {workdir}")
+    procs, peers = start_ring(args.nodes, args.script, workdir)
+    try:
+        if not wait_for_ring(peers, args.settle):
+            print(f"Ring did not converge within {args.settle}s")
+            return 1
+        results = {}
+
+        def put(entry, key, key_hash, value):
+            owner, hops = walk(entry, key_hash)
+            Pool.connect(owner).put(key_hash, key, value)
+            return hops
+
+        def get(entry, key, key_hash):
+            owner, hops = walk(entry, key_hash)
+            Pool.connect(owner).get(key_hash, key)
+            return hops
+
+        def find_successor(entry, key_hash):
+            Pool.connect(entry).find_successor(key_hash)
+
+        # Every key exists before reads are timed
+        run_phase("preload", put, [(rng.choice(peers), key, key_hash, key)
+                                   for key, key_hash in zip(keys.keys, keys.hashes)], args.concurrency)
+        draws = [keys.draw() for _ in range(args.ops)]
+        results['find_successor'] = run_phase("find_successor", find_successor,
+                                              [(rng.choice(peers), key_hash) for _, key_hash in draws], args.concurrency)
+        results['put'] = run_phase("put", put, [(rng.choice(peers), key, key_hash, f"{key}-{i}")
+                                                for i, (key, key_hash) in enumerate(draws)], args.concurrency)
+        results['get'] = run_phase("get", get, [(rng.choice(peers), key, key_hash) for key, key_hash in draws],
+                                   args.concurrency)
+        results['background_rpcs_per_sec'] = background_rate(peers, args.idle)
+        print(f"Background: {results['background_rpcs_per_sec']:.1f} RPCs/s across {args.nodes} nodes")
+    finally:
+        stop_ring(procs)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'config': vars(args),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark a local Chord ring.")
+    parser.add_argument("--nodes", type=int, default=5, help="nodes to start on ports 3000 and up")
+    parser.add_argument("--script", default="Chord.py", help="node implementation to run")
+    parser.add_argument("--ops", type=int, default=2000, help="operations per timed phase")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads issuing operations")
+    parser.add_argument("--keys", type=int, default=1000, help="size of the key space")
+    parser.add_argument("--dist", choices=("uniform", "zipf"), default="uniform", help="key popularity")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--idle", type=float, default=10, help="seconds to sample background RPCs")
+    parser.add_argument("--settle", type=float, default=60, help="seconds to wait for the ring to form")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    sys.exit(main(parser.parse_args()))
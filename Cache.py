@@ -0,0 +1,48 @@
+import collections
+import threading
+import time
+import Metrics
+
+# Bounded LRU cache of versioned values, shared by nodes and clients. An entry is served without
+# asking the owner for ttl seconds; after that the caller revalidates it by version or refetches.
+
+class ValueCache:
+    def __init__(self, size, ttl, name="values"):
+        self.size = size  # 0 disables the cache
+        self.ttl = ttl
+        self.name = name  # Label for the hit and miss counters
+        self.entries = collections.OrderedDict()  # key -> (value, version, expiry time)
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """Returns (value, version, fresh) for a cached key, or None. Stale entries stay until evicted so they can be revalidated."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                Metrics.inc("cache_misses_total", cache=self.name)
+                return None
+            self.entries.move_to_end(key)
+        value, version, expires = entry
+        fresh = time.monotonic() < expires
+        Metrics.inc("cache_hits_total" if fresh else "cache_stale_total", cache=self.name)
+        return value, version, fresh
+
+    def store(self, key, value, version):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, version, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def renew(self, key):
+        """Restarts the ttl of an entry whose version the owner just confirmed."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (entry[0], entry[1], time.monotonic() + self.ttl)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
@@ -1,239 +1,1603 @@
-from xmlrpc.server import SimpleXMLRPCServer
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import xmlrpc.client
-import hashlib
+import Cache
+import FailureDetector
+import Metrics
+import Pool
+import Store
+import Wire
+from Ring import m, nodes, hashFunction, is_between, vnode_id
+import json
+import logging
+import os
+import random
+import selectors
 import threading
 import time
 
-def hashFunction(key):
-    """Generates a hash for the given key."""
-    print(f"Hashing key: {key}")
-    return int(hashlib.sha1(key.encode()).hexdigest(), 16) % nodes
-
-def is_between(x, a, b, ring_size):
-    """Check if x is between a and b on a modular ring of size ring_size."""
-    # x = x % ring_size
-    # a = a % ring_size
-    # b = b % ring_size
-    # print(x, a, b)
-    if a < b:
-        return a < x <= b
-    else:  # Handle the case when there's a wrap-around in the ring
-        return x > a or x <= b
-
-m = 6
-nodes = 2 ** m
+# Logging settings
+log_level = os.environ.get("CHORD_LOG_LEVEL", "INFO")  # DEBUG also logs every lookup step and key access
+
+logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("chord")
+
+# Virtual node settings
+# Ring positions hosted by this process; scale with its capacity. They share its server, store and
+# connection pool. More than one needs the binary transport, which names the position in each frame;
+# an XML-RPC call always reaches the first position.
+virtual_nodes = int(os.environ.get("CHORD_VNODES", 1))
+
+# Lookup settings
+lookup_mode = "iterative"  # "iterative" drives hops from this node, "recursive" forwards find_successor
+max_hops = 32  # Give up on an iterative lookup after this many hops
+lookup_deadline = 2  # Seconds a whole lookup may take; the remainder is carried along its hops
+
+# Failure recovery settings
+successor_list_size = 4  # r: backup successors kept for failover
+
+# Replication settings
+replication_factor = 3  # k: copies of each key, the owner's included
+write_ack = "quorum"  # Copies that must be stored before put returns: "one", "quorum" or "all"
+
+# Finger maintenance settings
+fingers_per_tick = 4  # Finger lookups per fix_fingers run while the ring is quiet
+churn_fingers_per_tick = 32  # Finger lookups per run right after a change is seen
+churn_ticks = 3  # Runs at the faster rate after a change
+join_lookups = 8  # Finger lookups a joining node runs in parallel; 0 leaves the fingers to fix_fingers
+
+# Maintenance schedule settings
+schedule = {  # Task -> (fastest, slowest) seconds between runs
+    'stabilize': (0.5, 10),
+    'fix_fingers': (0.5, 30),
+    'check_predecessor': (1, 10),
+    'check_fingers': (2, 30),
+    'rebalance': (60, 600),
+    'report': (5, 5),  # Status line, idle connection and abandoned handoff sweep
+}
+backoff = 1.5  # A task's interval grows by this factor after each run that saw no change in the ring
+jitter = 0.2  # Intervals vary randomly by this fraction so nodes don't run in lockstep
+
+# Failure detector settings
+phi_threshold = 5  # Suspicion at which a silent peer gets pinged; phi 5 is about a 1 in 100000 chance it is alive
+ping_timeout = 1  # Seconds a suspected peer has to answer before it is dropped
+liveness_pings = 4  # Most suspected fingers pinged per check_fingers run
+
+# Load balancing settings
+load_metric = "keys"  # What rebalancing evens out: "keys", "bytes" or "requests" (per second)
+rebalance_ratio = 4  # Move next to a neighbour carrying this many times our load; 0 turns rebalancing off
+rebalance_min_keys = 100  # A neighbour's range is never split below this many keys
+load_refresh = 10  # Seconds the statistics of our range are reused before they are recomputed
+
+# Proximity settings
+proximity_candidates = 4  # Nodes kept per finger interval so routing can pick the nearest; 1 turns it off
+rtt_ttl = 60  # Seconds before a candidate's round-trip time is measured again
+
+# Cache settings
+cache_size = 1024  # Values of other nodes' hot keys kept for lookups passing through here; 0 turns it off
+cache_ttl = 5  # Seconds a cached value is served before it expires
+
+# Storage settings
+storage_engine = "log"  # "memory" keeps keys in RAM only, "log" persists them to an append-only log
+storage_dir = "chord-data"  # Where the log engine keeps one file per node
+
+# Key handoff settings
+handoff_chunk_size = 500  # Entries per chunk when a range moves on join or leave
+handoff_max_chunk_size = 20000
+handoff_chunk_seconds = 0.5  # Chunk size adapts to keep each round trip near this
+handoff_timeout = 120  # Seconds without a chunk moving after which a handoff is abandoned and its writes dropped
+
+# Ring membership settings
+bootstrap_node = {'node_id': 3000, 'ip': 'localhost', 'port': '3000'}  # Joined at startup, and as a last resort when rejoining
+rejoin_attempts = 3  # Rounds over the known entry points when a rebalance move cannot rejoin at once
+
+# Server settings
+max_workers = 32  # Number of requests served concurrently by this node
+request_queue_size = 128  # Pending connections before the OS starts refusing
+# Idle binary connections wait in a selector and take no worker; an idle XML-RPC connection holds
+# one worker until it times out, so XML-RPC-only peers should keep fewer than max_workers open
+keepalive_timeout = 5  # Seconds an idle persistent connection is kept open
 
 # User-defined variables
 ip = "localhost"
-port = input("Enter port number: ")
-node_id = hashFunction(ip + port)
 
-successor = {'node_id': node_id, 'ip': ip, 'port': port}
-predecessor = None
+replication_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chord-replicate")
 
-finger_table = [{'node_id': node_id, 'ip': ip, 'port': port} for _ in range(m)]
+# A node's state lives in a ChordNode, and what the process owns (server, store, lock, version
+# counter, path cache, failure detector and transport) in the Host around it. A Host holds
+# virtual_nodes positions. The script below runs one Host; Simulator.py runs thousands in one
+# process over an in-memory transport.
 
-data = {}
+class ChordNode:
+    """One ring position. Its state is guarded by the host's lock, which is never held across an RPC."""
 
-def find_successor(key):
-    """Finds the successor of a given key."""
-    print(f"Finding successor for key: {key} in Node {node_id}")
-    if successor['node_id'] == node_id:
-        print(f"Node {node_id} is the only node in the ring. Returning itself as the successor.")
-        return successor
+    def __init__(self, host, index=0):
+        self.host = host
+        self.index = index
+        self.lock = host.lock  # Guards successor, predecessor, finger_table and store
+        self.store = host.store  # Owned keys and replicas of the keys owned by our predecessors
+        self.ip = host.ip
+        self.port = host.port
+        self.node_id = vnode_id(self.ip, self.port, index)
+        self.me = {'node_id': self.node_id, 'ip': self.ip, 'port': self.port}
 
-    if is_between(key, node_id, successor['node_id'], nodes):
-            print(f"Key {key} lies between Node {node_id} and its successor Node {successor['node_id']}")
-            return successor
+        self.successor = self.me
+        self.predecessor = None
 
-    # Forward the request to the successor
-    n_prime = closest_preceding_node(key)
-    if n_prime['node_id'] == node_id:
-        print(f"Forwarding successor request to Node {successor['node_id']}")
-        return successor
-    print(f"Forwarding successor request to Node {n_prime['node_id']}")
-    try:
-        return xmlrpc.client.ServerProxy(f"http://{n_prime['ip']}:{n_prime['port']}").find_successor(key)
-    except Exception as e:
-        print(f"Node {n_prime['node_id']} is not responding: {e}")
+        self.finger_table = [self.me for _ in range(m)]
+        self.successor_list = []  # The next r live nodes after this one, successor first
+        self.finger_candidates = [[] for _ in range(m)]  # Nodes in finger i's interval [n + 2^i, n + 2^(i+1)), finger first
+        self.peer_rtt = {}  # node_id -> (smoothed round-trip seconds, monotonic time of the last sample)
+        self.routes = [[] for _ in range(m)]  # Interval i -> (distance, node) of every known node in it, in the order routing tries them
+        self.routes_dirty = True  # Routes are rebuilt on the next lookup after this is set
+
+        self.replicas = []  # Successors currently holding copies of our keys
+        self.replicas_dirty = False  # Set when our range or replica set changes and copies need repair
+        self.known_ring_hosts = None  # Hosts in the ring, once our successor list wraps around to us, i.e. the ring has fewer positions than it holds
+        self.handoffs = {}  # Receiving node_id -> range being handed over, and writes to it since the handoff began
+        self.requests_served = 0  # Reads and writes of keys in our range, for the request rate
+        self.range_load = None  # Statistics of our range as last computed by load_stats, with when and at what request count
+        self.neighbor_load = {}  # node_id -> statistics our predecessor or successor shared during stabilize
+
+        self.next = 0  # Next finger fix_fingers refreshes
+        self.churn = 0
+        self.changes = 0  # Ring changes seen so far; the scheduler backs off a task only if a run saw none
+        self.intervals = {task: bounds[0] for task, bounds in schedule.items()}  # Task -> current seconds between runs
+        self.wake = threading.Event()  # Set when intervals tighten so the scheduler replans
+
+    def find_successor(self, key, budget=None):
+        """Finds the successor of a given key, giving up after budget seconds (lookup_deadline by default)."""
+        Metrics.inc("lookups_total", mode="recursive")
+        log.debug("Finding successor for key: %s in Node %s", key, self.node_id)
+        deadline = time.monotonic() + (lookup_deadline if budget is None else budget)
+        # Each failed forward drops one dead node, so a few attempts route around a crash
+        for attempt in range(successor_list_size + 1):
+            with self.lock:
+                succ = self.successor
+            if succ['node_id'] == self.node_id:
+                log.debug("Node %s is the only node in the ring. Returning itself as the successor.", self.node_id)
+                return succ
+
+            if is_between(key, self.node_id, succ['node_id'], nodes):
+                    log.debug("Key %s lies between Node %s and its successor Node %s", key, self.node_id, succ['node_id'])
+                    return succ
+
+            # Forward the request to the successor
+            targets = self.preceding_nodes(key, count=2)
+            if budget is not None:
+                # A forwarded lookup: only the node that started it hedges, or every slow hop would fan out again
+                targets = targets[:1]
+            if not targets:
+                log.debug("Forwarding successor request to Node %s", succ['node_id'])
+                return succ
+            n_prime = targets[0]
+            log.debug("Forwarding successor request to Node %s", n_prime['node_id'])
+            failed = []
+            try:
+                return self.host.hedged_call(targets, 'find_successor', key, deadline - time.monotonic(),
+                                             deadline=deadline, failed=failed, delay=self.hedge_delay_for(n_prime))[1]
+            except TimeoutError:
+                log.warning("Lookup for key %s missed its deadline", key)
+                Metrics.inc("lookup_deadline_exceeded_total")
+                return None
+            except xmlrpc.client.Fault as e:
+                # The node answered, so it is alive; retrying elsewhere would only get the same refusal
+                log.warning("Node %s refused the lookup for key %s: %s", n_prime['node_id'], key, e)
+                return None
+            except Exception as e:
+                log.warning("Node %s is not responding: %s", n_prime['node_id'], e)
+            finally:
+                for node in failed:
+                    self.forget_node(node['node_id'])
         return None
 
-def closest_preceding_node(key):
-    """Finds the closest preceding node to the given key."""
-    print(f"Finding closest preceding node to key {key} in Node {node_id}")
-    for i in range(m - 1, -1, -1):
-        if finger_table[i]['node_id'] == node_id:
-            continue
-        if is_between(finger_table[i]['node_id'], node_id, key, nodes):
-            print(f"Closest preceding node to key {key} is Node {finger_table[i]['node_id']}")
-            return finger_table[i]
-        
-    return {'node_id': node_id, 'ip': ip, 'port': port}
-
-def get_predecessor():
-    """Returns the predecessor of the node."""
-    # print(f"Returning predecessor of Node {node_id}: {predecessor}")
-    return predecessor
-
-def join(n_prime):
-    """Joins the node to the Chord network through the given prime node."""
-    global successor
-    global data
-    print(f"Node {node_id} trying to join via Node {n_prime['node_id']}")
-    try:
-        n_prime = xmlrpc.client.ServerProxy(f"http://{n_prime['ip']}:{n_prime['port']}")
-        x = n_prime.find_successor(node_id)
-        successor = x
-        print(f"Node {node_id} joined the network. Successor is now Node {x['node_id']}")
-        # transfer keys from successor
-        keys = xmlrpc.client.ServerProxy(f"http://{successor['ip']}:{successor['port']}").get_keys(node_id)
-        # convert dictionary key to string
-        # Now you can safely merge or use the 'keys' dictionary
-        data = {**data, **keys}
-
-        # convert keys to integer
-        data = {int(k): v for k, v in data.items()}
-        print(f"Transferred keys from Node {successor['node_id']}")
-
-    except Exception as e:
-        print(f"Failed to join: {e}")
-
-def stabilize():
-    """Stabilizes the node."""
-    global successor
-    # print(f"Stabilizing Node {node_id}")
-    try:
-        x = xmlrpc.client.ServerProxy(f"http://{successor['ip']}:{successor['port']}").get_predecessor()
-        if x is not None:
-            if is_between(x['node_id'], node_id, successor['node_id'], nodes):
-                print(f"Updating successor to Node {x['node_id']}")
-                successor = x
-
-        if x is not None and successor['node_id'] == node_id:
-            print(f"Updating successor to Node {x['node_id']} due to stabilization check")
-            successor = x
-
-        print(f"Notifying Node {successor['node_id']} of new predecessor: Node {node_id}")
-        xmlrpc.client.ServerProxy(f"http://{successor['ip']}:{successor['port']}").notify({'node_id': node_id, 'ip': ip, 'port': port})
-    except Exception as e:
-        print(f"Failed to stabilize: {e}")
-
-def notify(n_prime):
-    """Notifies the node of a new predecessor."""
-    global predecessor
-    print(f"Node {node_id} received notify from Node {n_prime['node_id']}")
-    if n_prime['node_id'] == node_id:
-        print("Ignoring self notification.")
-        return
-    if predecessor is None:
-        print(f"Setting predecessor to Node {n_prime['node_id']} (first predecessor)")
-        predecessor = n_prime
-    elif is_between(n_prime['node_id'], predecessor['node_id'], node_id, nodes):
-        print(f"Updating predecessor to Node {n_prime['node_id']}")
-        predecessor = n_prime
-
-next = 0
-def fix_fingers():
-    """Fixes the finger table."""
-    global next
-    for i in range(m):
-        finger_table[i] = find_successor((node_id + 2 ** i) % nodes)
-
-def start_server():
-    """Starts the XML-RPC server."""
-    print(f"Starting server for Node {node_id} on port {port}")
-    server = SimpleXMLRPCServer((ip, int(port)), logRequests=False, allow_none=True)
-    server.register_function(find_successor, "find_successor")
-    server.register_function(join, "join")
-    server.register_function(get_predecessor, "get_predecessor")
-    server.register_function(stabilize, "stabilize")
-    server.register_function(notify, "notify")
-    server.register_function(hashFunction, "hashFunction")
-    server.register_function(put, "put")
-    server.register_function(get, "get")
-    server.register_function(suc_update, "suc_update")
-    server.register_function(pred_update, "pred_update")
-    server.register_function(get_keys, "get_keys")
-
-    print(f"Node {node_id} listening on port {port}")
-    server.serve_forever()
-
-def suc_update(node):
-    global successor
-    successor = node
-    return True
-
-def pred_update(node):
-    global predecessor
-    predecessor = node
-    return True
-
-def get_keys(key):
-    d2 = {}
-    for k, v in data.items():
-        print(k, v)  # Debugging: check the type and value of each key
-        print(predecessor['node_id'], key)  # Debugging: check the node_id and key comparison
-
-        # Ensure the key is converted to string before adding to d2
-        if is_between(k, predecessor['node_id'], key, nodes):
-            d2[str(k)] = v  # Convert key to string
-    
-    print(f"Returning keys for Node {key}: {d2}")
-    # delete keys from data
-    for k in d2.keys():
-        del data[int(k)]
-    return d2
-    
-def put(key, value):
-    print(f"Storing key '{key}' with value '{value}' in Node {node_id}")
-    data[key] = value
-
-def get(key):
-    print(f"Retrieving value for key '{key}' from Node {node_id}")
-    return data[key]
-
-def print_data():
-    print("--------------------")
-    print(data)
-    print("--------------------")
-
-def user_input_loop():
+    def find_next_hop(self, key, exclude=None, original_key=None):
+        """Answers a single step of an iterative lookup for the given key, avoiding the excluded node IDs.
+
+        Given the original key, the reply also carries a cached copy of its value if we hold one. A copy past
+        its ttl is only served once the owner confirms its version.
+        """
+        hop = self.next_hop(key, exclude)
+        if original_key is not None:
+            entry = self.host.path_cache.lookup((key, original_key))
+            if entry is not None and (entry[2] or self.revalidate_cached(key, original_key, entry)):
+                hop['cached'] = {'value': entry[0][0], 'version': entry[1]}
+        return hop
+
+    def revalidate_cached(self, key_hash, key, entry):
+        """Asks the owner recorded with a stale path cache entry whether its version is still current."""
+        (value, owner), version, _ = entry
+        try:
+            current = self.host.connect(owner, ping_timeout).get_version(key_hash, key)
+        except Exception:
+            current = None  # The owner moved or died; let the lookup go on to the new one
+        if current != version:
+            self.host.path_cache.invalidate((key_hash, key))
+            return False
+        self.host.path_cache.renew((key_hash, key))
+        return True
+
+    def next_hop(self, key, exclude):
+        me = self.me
+        excluded = set(exclude or [])
+        with self.lock:
+            succ = self.successor
+            backups = list(self.successor_list)
+        if succ['node_id'] in excluded:
+            # The caller saw our successor fail; the first live backup takes over its range
+            live = [s for s in backups if s['node_id'] not in excluded]
+            succ = live[0] if live else me
+        if succ['node_id'] == self.node_id or is_between(key, self.node_id, succ['node_id'], nodes):
+            return {'done': True, 'node': succ, 'successor': succ, 'self': me}
+
+        targets = self.preceding_nodes(key, excluded, 2)
+        if not targets:
+            return {'done': True, 'node': succ, 'successor': succ, 'self': me}
+        hop = {'done': False, 'node': targets[0], 'successor': succ, 'self': me}
+        if len(targets) > 1:
+            # The caller asks this one as well if n_prime is slow to answer
+            hop['backup'] = targets[1]
+        return hop
+
+    def find_successor_iterative(self, key, start=None):
+        """Finds the successor of a key by driving the hops from this node."""
+        Metrics.inc("lookups_total", mode="iterative")
+        with Metrics.timer("lookup_seconds"):
+            node, hops = self.walk_lookup(key, start)
+        if node is None:
+            Metrics.inc("lookup_failures_total")
+        else:
+            Metrics.observe("lookup_hops", hops, Metrics.hop_buckets)
+        return node
+
+    def walk_lookup(self, key, start):
+        """Runs the hops of an iterative lookup. Returns (successor or None, hops taken)."""
+        deadline = time.monotonic() + lookup_deadline
+        local = start is None or start.get('node_id') == self.node_id
+        responder = None if local else start
+        exclude = []
+
+        def ask(targets):
+            """Asks the first target for the next hop, hedging with the rest. Returns (node that answered, hop)."""
+            if targets[0] is None:
+                return None, self.find_next_hop(key, exclude)
+            failed = []
+            try:
+                return self.host.hedged_call(targets, 'find_next_hop', key, list(exclude), deadline=deadline,
+                                             failed=failed, delay=self.hedge_delay_for(targets[0]))
+            finally:
+                # Route around the dead nodes from now on
+                for node in failed:
+                    exclude.append(node['node_id'])
+                    self.forget_node(node['node_id'])
+
+        hops = 0
+        try:
+            responder, hop = ask([responder])
+            hops = 1
+            while not hop['done']:
+                if hops >= max_hops:
+                    log.warning("Lookup for key %s gave up after %s hops", key, hops)
+                    return None, hops
+                targets = [hop['node']] + ([hop['backup']] if 'backup' in hop else [])
+                try:
+                    responder, hop = ask(targets)
+                except (TimeoutError, xmlrpc.client.Fault):
+                    raise
+                except Exception as e:
+                    # Ask the last live hop again, this time without the nodes that failed
+                    log.warning("Node %s is not responding: %s", targets[0]['node_id'], e)
+                    responder, hop = ask([responder])
+                hops += 1
+        except TimeoutError:
+            log.warning("Lookup for key %s missed its %ss deadline after %s hops", key, lookup_deadline, hops)
+            Metrics.inc("lookup_deadline_exceeded_total")
+            return None, hops
+        except xmlrpc.client.Fault as e:
+            log.warning("Lookup for key %s was refused: %s", key, e)
+            return None, hops
+        except Exception as e:
+            log.warning("Lookup for key %s lost its previous hop: %s", key, e)
+            return None, hops
+        log.debug("Key %s resolved to Node %s in %s hops", key, hop['node']['node_id'], hops)
+        return hop['node'], hops
+
+    def lookup(self, key, start=None):
+        """Finds the successor of a key using the configured lookup mode."""
+        if lookup_mode == "iterative":
+            return self.find_successor_iterative(key, start)
+        if start is None:
+            return self.find_successor(key)
+        return self.host.connect(start).find_successor(key)
+
+    def closest_preceding_node(self, key, exclude=()):
+        """Finds the closest preceding node to the given key among the fingers and the successor list."""
+        found = self.preceding_nodes(key, exclude)
+        if found:
+            log.debug("Closest preceding node to key %s is Node %s", key, found[0]['node_id'])
+            return found[0]
+        return self.me
+
+    def preceding_nodes(self, key, exclude=(), count=1):
+        """Returns up to count distinct nodes preceding the key to forward a lookup to, best first."""
+        with self.lock:
+            if self.routes_dirty:
+                self.rebuild_routes()
+            table = self.routes
+        limit = (key - self.node_id) % nodes or nodes  # Eligible nodes lie at distances in (0, limit]
+        found = []
+        for i in range(min(limit.bit_length(), m) - 1, -1, -1):
+            for distance, candidate in table[i]:
+                if distance > limit or candidate['node_id'] in exclude:
+                    continue
+                if not found and proximity_candidates > 1 and \
+                        any(distance < d <= limit and c['node_id'] not in exclude for d, c in table[i]):
+                    Metrics.inc("proximity_reroutes_total")
+                found.append(candidate)
+                if len(found) == count:
+                    return found
+        return found
+
+    def invalidate_routes(self):
+        """Marks routes for a rebuild after fingers, backups, candidates or round-trip times changed."""
+        self.routes_dirty = True
+
+    def rebuild_routes(self):
+        """Files every known node under its finger interval, in the order routing should try them. Caller holds the lock."""
+        sources = list(self.finger_table) + list(self.successor_list)
+        if proximity_candidates > 1:
+            sources += [c for interval in self.finger_candidates for c in interval]
+        known = {}
+        for candidate in sources:
+            if candidate['node_id'] != self.node_id:
+                known.setdefault(candidate['node_id'], candidate)
+        table = [[] for _ in range(m)]
+        for peer, candidate in known.items():
+            distance = (peer - self.node_id) % nodes
+            table[distance.bit_length() - 1].append((distance, candidate))
+        peer_rtt = self.peer_rtt
+        for interval in table:
+            if proximity_candidates > 1:
+                # Any node in the same power-of-two band halves the distance to keys past it just as well;
+                # try the nearest on the network first (proximity neighbor selection), then the farthest
+                interval.sort(key=lambda pair: (0, peer_rtt[pair[1]['node_id']][0]) if pair[1]['node_id'] in peer_rtt
+                              else (1, -pair[0]))
+            else:
+                interval.sort(key=lambda pair: -pair[0])
+        self.routes = table
+        self.routes_dirty = False
+
+    def forget_node(self, dead_id):
+        """Drops a node that stopped responding from the successor list and the finger table."""
+        with self.lock:
+            self.successor_list[:] = [s for s in self.successor_list if s['node_id'] != dead_id]
+            if self.successor['node_id'] == dead_id:
+                self.successor = self.successor_list[0] if self.successor_list else self.me
+                log.warning("Successor Node %s failed, failing over to Node %s", dead_id, self.successor['node_id'])
+            for i in range(m):
+                if self.finger_table[i]['node_id'] == dead_id:
+                    self.finger_table[i] = self.successor
+                self.finger_candidates[i] = [c for c in self.finger_candidates[i] if c['node_id'] != dead_id]
+            self.peer_rtt.pop(dead_id, None)
+            self.invalidate_routes()
+        self.host.liveness.forget(dead_id)
+        self.note_churn()
+
+    def record_rtt(self, peer_id, seconds):
+        """Folds a round-trip sample into the peer's smoothed RTT."""
+        with self.lock:
+            previous = self.peer_rtt.get(peer_id)
+            smoothed = seconds if previous is None else 0.8 * previous[0] + 0.2 * seconds
+            self.peer_rtt[peer_id] = (smoothed, time.monotonic())
+            self.invalidate_routes()
+
+    def hedge_delay_for(self, node):
+        """Returns how long to wait on the node before hedging, based on its measured RTT."""
+        with self.lock:
+            sample = self.peer_rtt.get(node.get('node_id'))
+        return Pool.hedge_after(sample and sample[0])
+
+    def timed_call(self, node, method, *args):
+        """Calls a method on a peer and records how long the round trip took."""
+        started = time.perf_counter()
+        result = getattr(self.host.connect(node), method)(*args)
+        self.record_rtt(node['node_id'], time.perf_counter() - started)
+        return result
+
+    def refresh_candidates(self, i, finger):
+        """Gathers nodes in finger i's interval from the finger's successor list and measures the ones with no fresh RTT."""
+        if proximity_candidates <= 1 or finger['node_id'] == self.node_id:
+            return
+        # [start, end) as the half-open (start - 1, end - 1] that is_between expects
+        low = (self.node_id + 2 ** i - 1) % nodes
+        high = (self.node_id + 2 ** (i + 1) - 1) % nodes
+        try:
+            following = self.timed_call(finger, 'get_successor_list')
+        except Exception as e:
+            log.warning("Node %s is not responding: %s", finger['node_id'], e)
+            return
+        found = {finger['node_id']: finger}
+        for s in following:
+            if len(found) < proximity_candidates and s['node_id'] != self.node_id and is_between(s['node_id'], low, high, nodes):
+                found.setdefault(s['node_id'], s)
+        now = time.monotonic()
+        for candidate in list(found.values())[1:]:
+            with self.lock:
+                sample = self.peer_rtt.get(candidate['node_id'])
+            if sample is not None and now - sample[1] < rtt_ttl:
+                continue
+            try:
+                self.timed_call(candidate, 'get_predecessor')
+            except Exception as e:
+                log.debug("Dropping unresponsive candidate Node %s: %s", candidate['node_id'], e)
+                del found[candidate['node_id']]
+        with self.lock:
+            self.finger_candidates[i] = list(found.values())
+            self.invalidate_routes()
+
+    def get_successor_list(self):
+        """Returns the successor followed by its backups."""
+        with self.lock:
+            return list(self.successor_list) or [self.successor]
+
+    def get_successor(self):
+        """Returns the successor of the node."""
+        with self.lock:
+            return self.successor
+
+    def get_predecessor(self):
+        """Returns the predecessor of the node."""
+        # print(f"Returning predecessor of Node {node_id}: {predecessor}")
+        with self.lock:
+            return self.predecessor
+
+    def join(self, n_prime):
+        """Joins the node to the Chord network through the given prime node. Returns whether it joined."""
+        log.info("Node %s trying to join via Node %s", self.node_id, n_prime['node_id'])
+        try:
+            x = self.lookup(self.node_id, n_prime)
+            if x is None:
+                log.error("Failed to join: no successor found for Node %s", self.node_id)
+                return False
+            if x['node_id'] == self.node_id and not self.is_me(n_prime):
+                # The ring still lists us, e.g. when rejoining where we were; our successor owns the next ID
+                x = self.lookup((self.node_id + 1) % nodes, n_prime)
+                if x is None or x['node_id'] == self.node_id:
+                    log.error("Failed to join: Node %s routed the lookup back to us", n_prime['node_id'])
+                    return False
+            with self.lock:
+                self.successor = x
+            log.info("Node %s joined the network. Successor is now Node %s", self.node_id, x['node_id'])
+            if x['node_id'] != self.node_id:
+                # Build the finger table while the keys move so we route in O(log N) hops right away
+                fingers = threading.Thread(target=self.bootstrap_fingers, args=(x,), daemon=True)
+                fingers.start()
+                # transfer keys from successor
+                self.pull_handoff(x)
+                fingers.join()
+            return True
+
+        except Exception as e:
+            log.error("Failed to join: %s", e)
+            return False
+
+    def is_me(self, node):
+        """Tells whether a reference points at this position. One with our address and an ID we don't host, such as
+        bootstrap_node, reaches our first position."""
+        if (node['ip'], str(node['port'])) != (self.ip, self.port):
+            return False
+        return self.host.vnodes.get(node.get('node_id'), self.host.first) is self
+
+    def stabilize(self):
+        """Stabilizes the node."""
+        with Metrics.timer("stabilize_seconds"):
+            self.stabilize_once()
+
+    def stabilize_once(self):
+        # print(f"Stabilizing Node {node_id}")
+        try:
+            while True:
+                with self.lock:
+                    succ = self.successor
+                if succ['node_id'] == self.node_id:
+                    x = self.get_predecessor()
+                    break
+                try:
+                    x = self.timed_call(succ, 'get_predecessor')
+                    break
+                except Exception as e:
+                    log.warning("Successor Node %s is not responding: %s", succ['node_id'], e)
+                    self.forget_node(succ['node_id'])
+            if x is not None and x['node_id'] != self.node_id and is_between(x['node_id'], self.node_id, succ['node_id'], nodes):
+                # Our successor may still list a crashed predecessor; don't fail back onto it
+                try:
+                    self.host.connect(x).get_predecessor()
+                except Exception as e:
+                    log.warning("Ignoring unresponsive Node %s as successor: %s", x['node_id'], e)
+                    x = None
+            with self.lock:
+                if x is not None:
+                    if is_between(x['node_id'], self.node_id, self.successor['node_id'], nodes):
+                        log.info("Updating successor to Node %s", x['node_id'])
+                        self.successor = x
+
+                if x is not None and self.successor['node_id'] == self.node_id:
+                    log.info("Updating successor to Node %s due to stabilization check", x['node_id'])
+                    self.successor = x
+                if self.successor['node_id'] != succ['node_id']:
+                    self.note_churn()
+                succ = self.successor
+
+            if succ['node_id'] == self.node_id:
+                return
+            log.debug("Notifying Node %s of new predecessor: Node %s", succ['node_id'], self.node_id)
+            # Neighbours swap load statistics on the notify they exchange anyway
+            load = self.host.connect(succ).notify(self.me, self.load_stats())
+            if load is not None:
+                with self.lock:
+                    self.neighbor_load[succ['node_id']] = load
+
+            # Our backups are our successor and the first r - 1 of its backups
+            backups = [succ] + self.host.connect(succ).get_successor_list()
+            with self.lock:
+                ids = [s['node_id'] for s in backups]
+                if self.node_id in ids:
+                    ring = backups[:ids.index(self.node_id) + 1]
+                    self.known_ring_hosts = len({(s['ip'], str(s['port'])) for s in ring})
+                else:
+                    self.known_ring_hosts = None
+                self.successor_list[:] = [s for s in backups if s['node_id'] != self.node_id][:successor_list_size]
+                self.invalidate_routes()
+            self.repair_replicas()
+        except Exception as e:
+            log.warning("Failed to stabilize: %s", e)
+            Metrics.inc("stabilize_failures_total")
+
+    def notify(self, n_prime, load=None):
+        """Notifies the node of a new predecessor. Given the notifier's load statistics, returns ours in exchange."""
+        log.debug("Node %s received notify from Node %s", self.node_id, n_prime['node_id'])
+        if n_prime['node_id'] == self.node_id:
+            log.debug("Ignoring self notification.")
+            return
+        # The predecessor notifies us on every stabilize, which doubles as its heartbeat
+        self.host.liveness.heartbeat(n_prime['node_id'])
+        if load is not None:
+            with self.lock:
+                self.neighbor_load[n_prime['node_id']] = load
+        with self.lock:
+            pred = self.predecessor
+        if pred is not None and pred['node_id'] != n_prime['node_id'] and \
+                not is_between(n_prime['node_id'], pred['node_id'], self.node_id, nodes):
+            # Someone behind our predecessor is notifying us, which happens when the predecessor died
+            try:
+                self.host.connect(pred, ping_timeout).get_predecessor()
+            except Exception as e:
+                log.warning("Predecessor Node %s is not responding: %s", pred['node_id'], e)
+                with self.lock:
+                    if self.predecessor is pred:
+                        self.predecessor = None
+                # Our range just grew to cover the dead node's keys
+                self.mark_replicas_dirty()
+        with self.lock:
+            if self.predecessor is None:
+                log.info("Setting predecessor to Node %s (first predecessor)", n_prime['node_id'])
+                self.predecessor = n_prime
+                self.note_churn()
+                self.mark_replicas_dirty()
+            elif is_between(n_prime['node_id'], self.predecessor['node_id'], self.node_id, nodes):
+                log.info("Updating predecessor to Node %s", n_prime['node_id'])
+                self.predecessor = n_prime
+                self.note_churn()
+        if load is not None:
+            return self.load_stats()
+
+    def note_churn(self):
+        """Speeds up maintenance after the ring changed: every task drops to its fastest interval."""
+        self.churn = churn_ticks
+        with self.lock:
+            self.changes += 1
+            for task in self.intervals:
+                self.intervals[task] = schedule[task][0]
+        self.wake.set()
+
+    def ping(self, node):
+        """Returns whether the node answers within ping_timeout."""
+        Metrics.inc("liveness_pings_total")
+        try:
+            self.host.connect(node, ping_timeout).get_predecessor()
+            return True
+        except Exception as e:
+            log.warning("Node %s is not responding: %s", node['node_id'], e)
+            return False
+
+    def check_predecessor(self):
+        """Clears the predecessor once it stops responding, so a live node can take its place through notify.
+
+        The predecessor's notify calls serve as heartbeats; it is only pinged when they stop arriving.
+        """
+        with self.lock:
+            pred = self.predecessor
+        if pred is None or pred['node_id'] == self.node_id or self.host.liveness.phi(pred['node_id']) < phi_threshold:
+            return
+        if self.ping(pred):
+            return
+        with self.lock:
+            if self.predecessor is pred:
+                self.predecessor = None
+        self.host.liveness.forget(pred['node_id'])
+        # Our range just grew to cover the dead node's keys
+        self.mark_replicas_dirty()
+        self.note_churn()
+
+    def check_fingers(self):
+        """Pings the fingers and backup successors we have not heard from in a while and drops the dead ones."""
+        with self.lock:
+            peers = {p['node_id']: p for p in self.finger_table + self.successor_list if p['node_id'] != self.node_id}
+        suspicion = {peer: self.host.liveness.phi(peer) for peer in peers}
+        suspects = sorted((peer for peer in peers if suspicion[peer] >= phi_threshold), key=suspicion.get, reverse=True)
+        for peer in suspects[:liveness_pings]:
+            if not self.ping(peers[peer]):
+                self.forget_node(peer)
+
+    def fix_fingers(self):
+        """Refreshes the finger table round-robin, spending at most a few lookups per call."""
+        started = time.perf_counter()
+        budget = churn_fingers_per_tick if self.churn > 0 else fingers_per_tick
+        self.churn = max(self.churn - 1, 0)
+        lookups = 0
+        for _ in range(m):
+            i = self.next
+            start = (self.node_id + 2 ** i) % nodes
+            with self.lock:
+                previous = self.successor if i == 0 else self.finger_table[i - 1]
+                old = self.finger_table[i]
+            if i == 0 or is_between(start, self.node_id, previous['node_id'], nodes):
+                # The previous finger already covers this start, no lookup needed
+                finger = previous
+            elif lookups < budget:
+                # Resolve outside the lock; the lookup may be a network round trip
+                finger = self.lookup(start)
+                lookups += 1
+                if finger is not None:
+                    self.refresh_candidates(i, finger)
+            else:
+                break
+            self.next = (self.next + 1) % m
+            if finger is None:
+                continue
+            if finger['node_id'] != old['node_id']:
+                self.note_churn()
+                with self.lock:
+                    self.finger_table[i] = finger
+                    self.invalidate_routes()
+        Metrics.observe("fix_fingers_seconds", time.perf_counter() - started)
+        Metrics.inc("finger_lookups_total", lookups)
+
+    def get_finger_table(self):
+        """Returns the finger table so a joining node can start from it."""
+        with self.lock:
+            return list(self.finger_table)
+
+    def bootstrap_fingers(self, succ):
+        """Seeds the finger table and successor list from a new successor, then resolves the fingers it cannot cover in parallel."""
+        if join_lookups <= 0:
+            return
+        started = time.perf_counter()
+        try:
+            seed = self.host.connect(succ).get_finger_table()
+            following = self.host.connect(succ).get_successor_list()
+        except Exception as e:
+            log.warning("Could not copy the finger table of Node %s: %s", succ['node_id'], e)
+            return
+        # Starts in (n, successor] belong to the successor; for the rest the successor's own finger i,
+        # whose start is just past ours, is a usable route until the lookup below corrects it
+        pending = [i for i in range(m) if not is_between((self.node_id + 2 ** i) % nodes, self.node_id, succ['node_id'], nodes)]
+        with self.lock:
+            for i in range(m):
+                self.finger_table[i] = succ
+            for i in pending:
+                if seed[i]['node_id'] != self.node_id:
+                    self.finger_table[i] = seed[i]
+            self.successor_list[:] = [s for s in [succ] + following if s['node_id'] != self.node_id][:successor_list_size]
+            self.invalidate_routes()
+        with ThreadPoolExecutor(max_workers=join_lookups, thread_name_prefix="chord-join") as executor:
+            for i, finger in zip(pending, executor.map(lambda i: self.lookup((self.node_id + 2 ** i) % nodes), pending)):
+                if finger is not None:
+                    with self.lock:
+                        self.finger_table[i] = finger
+                        self.invalidate_routes()
+        Metrics.observe("join_fingers_seconds", time.perf_counter() - started)
+        Metrics.inc("finger_lookups_total", len(pending))
+        log.info("Node %s resolved %s fingers in %.3fs after joining", self.node_id, len(pending), time.perf_counter() - started)
+
+    def suc_update(self, node):
+        with self.lock:
+            self.successor = node
+        return True
+
+    def pred_update(self, node):
+        with self.lock:
+            self.predecessor = node
+        return True
+
+    def get_keys(self, key):
+        """Hands over the buckets in (predecessor, key] as {str(hash): {original key: value}}."""
+        d2 = {}
+        with self.lock:
+            for k, original_key, v in self.store.pop_range(self.predecessor['node_id'], key):
+                # XML-RPC struct members must be strings
+                d2.setdefault(str(k), {})[original_key] = v
+
+            log.info("Returning %s buckets for Node %s", len(d2), key)
+        return d2
+
+    def scan_range(self, start, end, limit=1000):
+        """Returns about limit [hash, key, value, version] entries with hashes in (start, end], in ring order from start.
+
+        Buckets are never split. 'next' is the start to pass to continue the scan, or None when done.
+        """
+        with self.lock:
+            self.touch_handoffs(end)
+            entries = [[k, key, v, self.host.entry_version(k, key)] for k, key, v in self.store.scan(start, end, limit)]
+        if len(entries) < limit or entries[-1][0] == end:
+            return {'entries': entries, 'next': None}
+        return {'entries': entries, 'next': entries[-1][0]}
+
+    def owns(self, key):
+        """Checks whether the key falls in this node's range. Without a predecessor it cannot tell, so it accepts.
+
+        A range we are still handing over stays ours until the handoff commits.
+        """
+        with self.lock:
+            pred = self.predecessor
+            moving = any(is_between(key, h['start'], h['end'], nodes) for h in self.handoffs.values())
+        return pred is None or moving or is_between(key, pred['node_id'], self.node_id, nodes)
+
+    def touch_handoffs(self, end):
+        """Marks the handoffs of ranges ending at end as still moving. Caller holds the lock."""
+        now = time.monotonic()
+        for h in self.handoffs.values():
+            if h['end'] == end:
+                h['active'] = now
+
+    def expire_handoffs(self):
+        """Drops handoffs that have not moved a chunk for handoff_timeout, such as one whose receiver crashed mid-join."""
+        now = time.monotonic()
+        with self.lock:
+            stale = [r for r, h in self.handoffs.items() if now - h['active'] > handoff_timeout]
+            for receiver_id in stale:
+                h = self.handoffs.pop(receiver_id)
+                log.warning("Abandoning handoff of (%s, %s] to Node %s (%s late writes dropped)",
+                            h['start'], h['end'], receiver_id, len(h['dirty']))
+        for _ in stale:
+            Metrics.inc("handoffs_expired_total")
+
+    def record_handoff_write(self, key_hash, key, value, version):
+        """Remembers a write to a range being handed over so the commit can carry it. Caller holds the lock."""
+        for h in self.handoffs.values():
+            if is_between(key_hash, h['start'], h['end'], nodes):
+                h['dirty'][(key_hash, key)] = (value, version)
+
+    def check_owner(self, key):
+        """Rejects a single-key request for a key this node does not own."""
+        with self.lock:
+            self.requests_served += 1
+        if not self.owns(key):
+            Metrics.inc("wrong_owner_total")
+            raise xmlrpc.client.Fault(Pool.WRONG_OWNER, f"Node {self.node_id} does not own key {key}")
+
+    def put(self, key_hash, key, value):
+        """Stores a key we own. Returns the version of the write."""
+        log.debug("Storing key '%s' (Hash: %s) with value '%s' in Node %s", key, key_hash, value, self.node_id)
+        self.check_owner(key_hash)
+        with self.lock:
+            version = self.host.next_version()
+            self.store.put(key_hash, key, value, version)
+            self.record_handoff_write(key_hash, key, value, version)
+        self.replicate([[key_hash, key, value, version]])
+        return version
+
+    def get(self, key_hash, key):
+        log.debug("Retrieving value for key '%s' (Hash: %s) from Node %s", key, key_hash, self.node_id)
+        self.check_owner(key_hash)
+        with self.lock:
+            if not self.store.contains(key_hash, key):
+                raise KeyError(key)
+            return self.store.get(key_hash, key)
+
+    def get_versioned(self, key_hash, key):
+        """Returns a key we own as {'value', 'version'}."""
+        self.check_owner(key_hash)
+        with self.lock:
+            if not self.store.contains(key_hash, key):
+                raise KeyError(key)
+            return {'value': self.store.get(key_hash, key), 'version': self.host.entry_version(key_hash, key)}
+
+    def get_version(self, key_hash, key):
+        """Returns the version of a key we own without its value, or None if it is missing. Lets caches revalidate cheaply."""
+        self.check_owner(key_hash)
+        with self.lock:
+            if not self.store.contains(key_hash, key):
+                return None
+            return self.host.entry_version(key_hash, key)
+
+    def cache_put(self, key_hash, key, value, version):
+        """Caches a copy of another node's value so lookups passing through here can be answered directly.
+
+        Callers are not trusted: the copy is kept only if the key's owner reports the same version.
+        Returns whether it was kept.
+        """
+        if self.host.path_cache.size <= 0 or self.owns(key_hash):
+            return False
+        owner = self.find_successor_iterative(key_hash)
+        try:
+            current = owner and self.host.connect(owner, ping_timeout).get_version(key_hash, key)
+        except Exception as e:
+            log.debug("Could not check key %s with its owner: %s", key_hash, e)
+            current = None
+        if current is None or current != version:
+            Metrics.inc("cache_put_rejected_total")
+            return False
+        # The owner is kept with the copy so it can be revalidated once the ttl passes
+        self.host.path_cache.store((key_hash, key), (value, owner), version)
+        return True
+
+    def put_many(self, items):
+        """Stores a batch of [hash, key, value] entries. Returns the hashes that belong to another node."""
+        misrouted = [key_hash for key_hash, _, _ in items if not self.owns(key_hash)]
+        rejected = set(misrouted)
+        stored = [item for item in items if item[0] not in rejected]
+        copies = []
+        with self.lock:
+            self.requests_served += len(stored)
+            for key_hash, key, value in stored:
+                version = self.host.next_version()
+                self.store.put(key_hash, key, value, version)
+                self.record_handoff_write(key_hash, key, value, version)
+                copies.append([key_hash, key, value, version])
+        if copies:
+            self.replicate(copies)
+        log.debug("Stored %s keys in Node %s (%s misrouted)", len(stored), self.node_id, len(misrouted))
+        return misrouted
+
+    def get_many(self, keys):
+        """Retrieves a batch of [hash, key] entries. Missing keys map to None; hashes owned by another node are reported as misrouted."""
+        misrouted = [key_hash for key_hash, _ in keys if not self.owns(key_hash)]
+        with self.lock:
+            self.requests_served += len(keys) - len(misrouted)
+            values = [self.store.get(key_hash, key) for key_hash, key in keys]
+        log.debug("Retrieved %s keys from Node %s (%s misrouted)", len(keys), self.node_id, len(misrouted))
+        return {'values': values, 'misrouted': misrouted}
+
+    def begin_handoff(self, receiver):
+        """Starts handing our part of (predecessor, receiver] to a joining node. Repeat calls resume the same handoff.
+
+        Returns None if we have nothing to hand over, e.g. the receiver already is our predecessor after a restart;
+        handing over (predecessor, predecessor] would mean the whole ring.
+        """
+        with self.lock:
+            h = self.handoffs.get(receiver['node_id'])
+            if h is None:
+                start = self.predecessor['node_id'] if self.predecessor else self.node_id
+                if receiver['node_id'] in (start, self.node_id) or not is_between(receiver['node_id'], start, self.node_id, nodes):
+                    log.info("Nothing to hand to Node %s; it does not split our range", receiver['node_id'])
+                    return None
+                h = {'node': receiver, 'start': start, 'end': receiver['node_id'], 'dirty': {}}
+                self.handoffs[receiver['node_id']] = h
+                log.info("Handing keys in (%s, %s] to Node %s", h['start'], h['end'], receiver['node_id'])
+            h['active'] = time.monotonic()
+        return {'start': h['start'], 'end': h['end']}
+
+    def commit_handoff(self, receiver_id):
+        """Finishes a handoff. Returns the writes made to the range while it was being copied."""
+        with self.lock:
+            h = self.handoffs.pop(receiver_id, None)
+            if h is None:
+                return []
+            delta = [[key_hash, key, value, version] for (key_hash, key), (value, version) in h['dirty'].items()]
+            if replication_factor <= 1:
+                # Without replication nobody else should keep a copy; otherwise we stay the new owner's first replica
+                self.store.pop_range(h['start'], h['end'])
+        log.info("Handoff to Node %s committed (%s late writes)", receiver_id, len(delta))
+        return delta
+
+    def checkpoint_path(self):
+        return os.path.join(storage_dir, f"handoff-{self.port}-{self.index}.json")
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_checkpoint(self, checkpoint):
+        os.makedirs(storage_dir, exist_ok=True)
+        tmp = self.checkpoint_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, self.checkpoint_path())
+
+    def pull_handoff(self, source):
+        """Copies our range from the source in chunks, then commits. Resumes from a checkpoint after a restart."""
+        if self.host.local(source) is not None:
+            # A position on this host already holds the keys in our shared store
+            return
+        rng = self.host.connect(source).begin_handoff(self.me)
+        if rng is None:
+            log.info("Node %s has no keys to hand us", source['node_id'])
+            return
+        cursor = rng['start']
+        # Only a persistent store still holds the chunks copied before the restart
+        checkpoint = self.load_checkpoint() if self.host.persistent else None
+        if checkpoint and checkpoint['source'] == source['node_id'] and \
+                checkpoint['start'] == rng['start'] and checkpoint['end'] == rng['end']:
+            cursor = checkpoint['next']
+            log.info("Resuming handoff from Node %s at %s", source['node_id'], cursor)
+        chunk = handoff_chunk_size
+        moved = 0
+        while cursor is not None:
+            started = time.monotonic()
+            page = self.host.connect(source).scan_range(cursor, rng['end'], chunk)
+            with self.lock:
+                for entry in page['entries']:
+                    self.host.apply_copy(*entry)
+            moved += len(page['entries'])
+            cursor = page['next']
+            if cursor is not None and self.host.persistent:
+                self.save_checkpoint({'source': source['node_id'], 'start': rng['start'], 'end': rng['end'], 'next': cursor})
+            chunk = next_chunk_size(chunk, time.monotonic() - started)
+            log.info("Handoff from Node %s: %s keys copied", source['node_id'], moved)
+        delta = self.host.connect(source).commit_handoff(self.node_id)
+        with self.lock:
+            for entry in delta:
+                self.host.apply_copy(*entry)
+        if self.host.persistent and os.path.exists(self.checkpoint_path()):
+            os.remove(self.checkpoint_path())
+        log.info("Transferred %s keys from Node %s", moved + len(delta), source['node_id'])
+
+    def send_range(self, target, start, end):
+        """Copies our entries in (start, end] to the target with replicate_many, in adaptively sized chunks.
+
+        Only one chunk is read under the lock at a time. Returns the number of entries sent.
+        """
+        cursor = start
+        chunk = handoff_chunk_size
+        moved = 0
+        while cursor is not None:
+            started = time.monotonic()
+            with self.lock:
+                self.touch_handoffs(end)
+                entries = [[k, key, v, self.host.entry_version(k, key)] for k, key, v in self.store.scan(cursor, end, chunk)]
+            if entries:
+                self.host.connect(target).replicate_many(entries)
+            moved += len(entries)
+            cursor = None if len(entries) < chunk or entries[-1][0] == end else entries[-1][0]
+            chunk = next_chunk_size(chunk, time.monotonic() - started)
+            log.debug("Sent %s keys to Node %s", moved, target['node_id'])
+        return moved
+
+    def push_handoff(self, target):
+        """Streams our owned range to the target in chunks while still serving it, then sends late writes."""
+        with self.lock:
+            start = self.predecessor['node_id'] if self.predecessor else self.node_id
+            h = {'node': target, 'start': start, 'end': self.node_id, 'dirty': {}, 'active': time.monotonic()}
+            self.handoffs[target['node_id']] = h
+        try:
+            moved = self.send_range(target, h['start'], h['end'])
+        finally:
+            # A failed push must not leave the range marked as moving, or we would keep recording its writes
+            with self.lock:
+                self.handoffs.pop(target['node_id'], None)
+        delta = [[k, key, v, version] for (k, key), (v, version) in h['dirty'].items()]
+        if delta:
+            self.host.connect(target).replicate_many(delta)
+        log.info("Handed %s keys to Node %s", moved + len(delta), target['node_id'])
+
+    def leave(self):
+        """Hands our range to the successor, then links our neighbours to each other.
+
+        A successor on this host already holds our keys in the shared store, so nothing is sent to it.
+        """
+        with self.lock:
+            pred, succ = self.predecessor, self.successor
+        if succ['node_id'] != self.node_id and self.host.local(succ) is None:
+            self.push_handoff(succ)
+        if pred is not None:
+            self.host.connect(pred).suc_update(succ)
+        if succ['node_id'] != self.node_id:
+            self.host.connect(succ).pred_update(pred)
+
+    def replica_targets(self):
+        """Returns the successors that should hold copies of our keys. Caller holds the lock.
+
+        Positions on this host share our store, so they are skipped; a copy there would not be a second copy.
+        """
+        return [s for s in self.successor_list
+                if s['node_id'] != self.node_id and self.host.local(s) is None][:replication_factor - 1]
+
+    def copies_wanted(self):
+        """Returns how many copies each key should have: replication_factor, or every host if the ring has fewer. Caller holds the lock."""
+        if self.successor['node_id'] == self.node_id:
+            return 1
+        if self.known_ring_hosts is None:
+            return replication_factor
+        return min(replication_factor, self.known_ring_hosts)
+
+    def replicate(self, entries):
+        """Copies freshly written [hash, key, value, version] entries to our replicas, waiting for enough acks."""
+        with self.lock:
+            targets = self.replica_targets()
+            # Count the copies the ring should hold, not just the successors we know of right now
+            needed = acks_needed(self.copies_wanted())
+        futures = [replication_executor.submit(self.host.connect(target).replicate_many, entries) for target in targets]
+        acks = 1  # Our own copy
+        # Take acks as they arrive so one slow replica doesn't hold up the quorum; with enough
+        # already (write_ack "one") don't wait at all, the copies finish in the background
+        if acks < needed:
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    acks += 1
+                except Exception as e:
+                    log.warning("Failed to replicate %s keys: %s", len(entries), e)
+                    Metrics.inc("replication_failures_total")
+                if acks >= needed:
+                    break
+        if acks < needed:
+            raise xmlrpc.client.Fault(Pool.UNDER_REPLICATED, f"Stored {acks} of {needed} required copies")
+
+    def replicate_many(self, entries):
+        """Stores [hash, key, value, version] copies sent by the node that owns them, keeping any newer copy we hold."""
+        with self.lock:
+            for entry in entries:
+                self.host.apply_copy(*entry)
+        return True
+
+    def get_replica(self, key_hash, key):
+        """Reads a key from whichever copy this node holds. Reports our load so clients can spread reads."""
+        with self.lock:
+            value = self.store.get(key_hash, key)
+        return {'value': value, 'load': self.host.inflight()}
+
+    def get_replicas(self):
+        """Returns the nodes holding copies of our keys, ourselves first."""
+        with self.lock:
+            backups = self.replica_targets()
+        return [self.me] + backups
+
+    def get_stats(self):
+        """Returns counters for benchmarks: calls served so far, calls in flight and keys stored."""
+        with self.lock:
+            keys = len(self.store)
+        return {'served': self.host.served(), 'inflight': self.host.inflight(), 'keys': keys}
+
+    def load_stats(self):
+        """Returns the keys, bytes and requests per second of our range, recomputed at most every load_refresh seconds."""
+        now = time.monotonic()
+        with self.lock:
+            if self.range_load is not None and now - self.range_load['at'] < load_refresh:
+                return self.range_load['stats']
+            start = self.predecessor['node_id'] if self.predecessor else self.node_id
+            # Copying the sorted hashes is all the lock is held for; no values are read
+            hashes = self.store.range_hashes(start, self.node_id)
+            served = self.requests_served
+        # A bucket holds one key unless two keys' hashes collide; sizes are kept up to date by the store
+        keys = len(hashes)
+        size = sum(self.store.sizes.get(key_hash, 0) for key_hash in hashes)
+        previous = self.range_load
+        rate = 0.0 if previous is None else (served - previous['served']) / (now - previous['at'])
+        stats = {'keys': keys, 'bytes': size, 'requests': rate}
+        self.range_load = {'at': now, 'served': served, 'stats': stats}
+        return stats
+
+    def split_point(self):
+        """Returns the hash that splits our range into two halves with about as many keys, or None if it is too small to split."""
+        with self.lock:
+            start = self.predecessor['node_id'] if self.predecessor else self.node_id
+            hashes = self.store.range_hashes(start, self.node_id)
+        if len(hashes) < rebalance_min_keys:
+            return None
+        middle = hashes[len(hashes) // 2 - 1]
+        return None if middle == self.node_id else middle
+
+    def rebalance(self):
+        """Moves this node into the range of a neighbour carrying rebalance_ratio times our load, taking half of its keys."""
+        if rebalance_ratio <= 0:
+            return
+        own = self.load_stats()
+        with self.lock:
+            neighbours = {n['node_id']: n for n in (self.predecessor, self.successor)
+                          if n is not None and n['node_id'] != self.node_id and n['node_id'] in self.neighbor_load}
+            loads = {n: self.neighbor_load[n] for n in neighbours}
+            busy = bool(self.handoffs)
+        if busy or not neighbours:
+            return
+        target = max(neighbours, key=lambda n: loads[n][load_metric])
+        heavy = loads[target]
+        if heavy['keys'] < rebalance_min_keys or heavy[load_metric] < rebalance_ratio * max(own[load_metric], 1):
+            return
+        log.info("Node %s carries %s %s, Node %s carries %s; moving into its range", self.node_id, own[load_metric],
+                 load_metric, target, heavy[load_metric])
+        self.relocate(neighbours[target])
+
+    def relocate(self, target):
+        """Leaves the ring and joins again at the target's split point, so the target hands us half of its keys.
+
+        Our own keys go to our successor on the way out; we are the lightly loaded side, so that is cheap.
+        """
+        with self.lock:
+            old_start = self.predecessor['node_id'] if self.predecessor else None  # Unknown: we can't tell our keys from replicas
+            old_id = self.node_id
+            # Ways back into the ring should the target die while we move
+            entry_points = [target] + [n for n in (self.successor, self.predecessor)
+                                       if n is not None and n['node_id'] != self.node_id]
+        entry_points.append(bootstrap_node)
+        entry_points = list({(n['ip'], str(n['port'])): n for n in entry_points}.values())
+        try:
+            self.leave()
+        except Exception as e:
+            # Our links are untouched, or a neighbour was pointed past us and stabilize will point it back;
+            # either way we still hold our keys, so staying in place is the rollback
+            log.warning("Failed to leave for a rebalance, staying in place: %s", e)
+            Metrics.inc("rebalance_failures_total")
+            self.note_churn()
+            return
+        Metrics.inc("rebalance_moves_total")
+        try:
+            split = self.host.connect(target).split_point()
+            pred = self.host.connect(target).get_predecessor()
+        except Exception as e:
+            log.warning("Could not split the range of Node %s, rejoining in place: %s", target['node_id'], e)
+            split = None
+        with self.lock:
+            if split is not None:
+                self.host.move(self, split)
+            # The target's predecessor precedes the split too, so ownership checks are right from the start
+            self.predecessor = pred if split is not None else None
+            self.successor = self.me
+            self.successor_list[:] = []
+            self.finger_table[:] = [self.me] * m
+            for candidates in self.finger_candidates:
+                candidates.clear()
+            self.invalidate_routes()
+            self.neighbor_load.clear()
+            self.range_load = None
+        self.mark_replicas_dirty()
+        joined = False
+        for attempt in range(rejoin_attempts):
+            if attempt:
+                # Give the ring time to drop the fingers that still point at our old position
+                time.sleep(jittered(schedule['stabilize'][1]))
+            for entry in entry_points:
+                if self.is_me(entry):
+                    continue
+                joined = self.join(entry)
+                if joined:
+                    break
+            if joined:
+                break
+        if not joined:
+            log.error("Node %s could not rejoin the ring after leaving it", self.node_id)
+            Metrics.inc("rebalance_failures_total")
+        elif self.node_id != old_id and old_start is not None:
+            self.drop_moved_keys(old_start, old_id)
+        self.note_churn()
+
+    def drop_moved_keys(self, start, end):
+        """Deletes the keys of our old range (start, end] that our new range doesn't cover; leave() handed them on.
+
+        Keys that a position on this host now owns stay, since it shares the store.
+        """
+        with self.lock:
+            if self.predecessor is None:
+                return
+            ranges = [(n.predecessor['node_id'], n.node_id) for n in self.host.vnodes.values() if n.predecessor is not None]
+            stale = [(key_hash, key) for key_hash in self.store.range_hashes(start, end)
+                     if not any(is_between(key_hash, lo, hi, nodes) for lo, hi in ranges)
+                     for key in list(self.store.buckets.get(key_hash, {}))]
+            for key_hash, key in stale:
+                self.store.delete(key_hash, key)
+        log.info("Dropped %s keys handed on when moving", len(stale))
+
+    def get_metrics(self):
+        """Returns this node's counters, gauges and histograms. The same data is served as text at GET /metrics."""
+        return Metrics.snapshot()
+
+    def mark_replicas_dirty(self):
+        self.replicas_dirty = True
+
+    def repair_replicas(self):
+        """Pushes our whole range to the replica set after it or our range changed.
+
+        Waits while the predecessor is unknown: our range could then only be taken as the whole ring,
+        which would push other nodes' replicas along with our keys.
+        """
+        with self.lock:
+            if self.predecessor is None:
+                return
+            targets = self.replica_targets()
+            new_targets = [t for t in targets if t['node_id'] not in {r['node_id'] for r in self.replicas}]
+            if self.replicas_dirty:
+                new_targets = targets
+            if not new_targets:
+                return
+            start = self.predecessor['node_id']
+            # Cleared before sending, so a change marked while we send gets its own repair
+            self.replicas_dirty = False
+        for target in new_targets:
+            try:
+                sent = self.send_range(target, start, self.node_id)
+                log.info("Replicated %s keys to Node %s", sent, target['node_id'])
+            except Exception as e:
+                log.warning("Failed to repair replicas on Node %s: %s", target['node_id'], e)
+                Metrics.inc("replication_failures_total")
+                self.mark_replicas_dirty()
+                return
+        with self.lock:
+            self.replicas = targets
+
+    def print_data(self):
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        with self.lock:
+            count = len(self.store)
+            snapshot = {} if count > 20 else {(k, key): v for k, key, v in self.store.items()}
+        log.debug("Data: %s", snapshot if count <= 20 else f"{count} keys stored")
+
+    def report(self):
+        """Logs the node's state, closes idle connections and drops abandoned handoffs."""
+        with self.lock:
+            fingers, pred, succ, keys = list(self.finger_table), self.predecessor, self.successor, len(self.store)
+        # Most fingers repeat in a sparse ring; list only where the table changes
+        shown = [f"{i} {fingers[i]['node_id']}" for i in range(m)
+               if i == 0 or fingers[i]['node_id'] != fingers[i - 1]['node_id']]
+        log.debug("Fingers: %s", ", ".join(shown))
+        self.print_data()
+        log.info("Node %s: predecessor %s, successor %s, %s keys", self.node_id,
+                 pred['node_id'] if pred else None, succ['node_id'], keys)
+        Pool.pool.evict_idle()
+        self.expire_handoffs()
+
+    def stabilize_loop(self):
+        """Runs each maintenance task on its own adaptive interval.
+
+        A task's interval grows by backoff after every run in which the ring did not change, up to its
+        slowest setting, and note_churn resets all of them to the fastest. A run that raises is logged,
+        counted and retried without backing off.
+        """
+        tasks = {'stabilize': self.stabilize, 'fix_fingers': self.fix_fingers,
+                 'check_predecessor': self.check_predecessor, 'check_fingers': self.check_fingers,
+                 'rebalance': self.rebalance, 'report': self.report}
+        due = {task: time.monotonic() for task in tasks}
+        while True:
+            task = min(due, key=due.get)
+            delay = due[task] - time.monotonic()
+            if delay > 0:
+                if self.wake.wait(delay):
+                    # Intervals just tightened; bring forward anything now due sooner
+                    self.wake.clear()
+                    now = time.monotonic()
+                    with self.lock:
+                        for t in due:
+                            due[t] = min(due[t], now + jittered(self.intervals[t]))
+                continue
+            with self.lock:
+                seen = self.changes
+            try:
+                tasks[task]()
+                failed = False
+            except Exception as e:
+                # A failed run is logged and retried at the same interval rather than ending the loop
+                log.warning("%s failed: %r", task, e)
+                Metrics.inc("maintenance_failures_total", task=task)
+                failed = True
+            with self.lock:
+                if self.changes == seen and not failed:
+                    self.intervals[task] = min(self.intervals[task] * backoff, schedule[task][1])
+                due[task] = time.monotonic() + jittered(self.intervals[task])
+
+def next_chunk_size(chunk, elapsed):
+    """Adapts the chunk size so each transfer round trip takes about handoff_chunk_seconds."""
+    if elapsed > handoff_chunk_seconds:
+        return max(chunk // 2, 1)
+    if elapsed < handoff_chunk_seconds / 4:
+        return min(chunk * 2, handoff_max_chunk_size)
+    return chunk
+
+def acks_needed(copies):
+    """Returns how many of the copies must be stored for a write to succeed under write_ack."""
+    if write_ack == "one":
+        return 1
+    if write_ack == "all":
+        return copies
+    return copies // 2 + 1
+
+def jittered(seconds):
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+# Methods of ChordNode callable over the wire
+rpc_methods = {'find_successor', 'find_next_hop', 'join', 'get_predecessor', 'get_successor', 'get_successor_list',
+               'get_finger_table', 'stabilize', 'notify', 'put', 'get', 'put_many', 'get_versioned', 'get_version',
+               'cache_put', 'get_many', 'replicate_many', 'get_replica', 'get_replicas', 'get_stats', 'get_metrics',
+               'load_stats', 'split_point', 'suc_update', 'pred_update', 'get_keys', 'scan_range', 'begin_handoff',
+               'commit_handoff'}
+
+class LocalProxy:
+    """Proxy look-alike that calls another position on this host directly instead of over the network."""
+
+    def __init__(self, host, node):
+        self.host = host
+        self.node = node
+
+    def __getattr__(self, method):
+        return lambda *args: self.host.invoke(self.node, method, args)
+
+class Host:
+    """A process serving one or more ring positions behind a single server, store, lock and connection pool.
+
+    The positions also share its path cache and failure detector. Their ranges never overlap, so the
+    store holds each key once however many of them own or replicate it.
+    """
+
+    def __init__(self, ip, port, count=virtual_nodes, engine=storage_engine, path=None):
+        self.ip = ip
+        self.port = str(port)
+        self.lock = threading.RLock()  # Guards the store and every position's state
+        self.persistent = engine == "log"
+        self.store = Store.open_store(engine, path or os.path.join(storage_dir, f"node-{self.port}.log"))
+        if len(self.store):
+            log.info("Reloaded %s keys from %s", len(self.store), storage_dir)
+        # Every accepted write gets a version so caches can revalidate. The store keeps each key's version
+        # (the log engine persists it); keys stored without one report boot_version, which is newer than
+        # any version handed out before a restart.
+        self.boot_version = time.time_ns()
+        self.last_version = max(self.boot_version, max(self.store.versions.values(), default=0))
+        self.path_cache = Cache.ValueCache(cache_size, cache_ttl, "path")  # (hash, key) -> (value, owner), pushed by clients
+        self.liveness = FailureDetector.PhiAccrual(first_interval=schedule['stabilize'][1])  # Fed by RPC replies and notify
+        self.server = None
+        self.vnodes = {}  # node_id -> ChordNode, in creation order
+        for index in range(count):
+            node = ChordNode(self, index)
+            self.vnodes[node.node_id] = node
+        self.first = next(iter(self.vnodes.values()))  # Answers calls that name no position, such as XML-RPC ones
+
+    def local(self, node):
+        """Returns our ChordNode for a node reference, or None if it lives elsewhere."""
+        if node['ip'] != self.ip or str(node['port']) != self.port:
+            return None
+        return self.vnodes.get(node.get('node_id'))
+
+    # Transport; Simulator.py overrides these to deliver calls in memory
+
+    def connect(self, node, timeout=None):
+        """Returns a proxy for the node, skipping the network when it is one of our own positions."""
+        local = self.local(node)
+        if local is not None:
+            return LocalProxy(self, local)
+        return Pool.connect(node, timeout)
+
+    def hedged_call(self, candidates, method, *args, deadline=None, failed=None, delay=None):
+        """Calls a method on the first candidate, hedging with the rest; see Pool.hedged_call.
+
+        One of our own positions answers at once, so it is called directly with nothing to hedge.
+        """
+        local = self.local(candidates[0])
+        if local is not None:
+            return candidates[0], self.invoke(local, method, args)
+        return Pool.hedged_call(candidates, method, *args, deadline=deadline, failed=failed, delay=delay)
+
+    def observe_peer(self, node, ok):
+        """Counts every reply from a peer as a heartbeat."""
+        if ok and node.get('node_id') is not None:
+            self.liveness.heartbeat(node['node_id'])
+
+    def invoke(self, node, method, params):
+        """Runs an RPC on one of our positions."""
+        if method == 'hashFunction':
+            return hashFunction(*params)
+        if method not in rpc_methods:
+            raise Exception(f'method "{method}" is not supported')
+        return getattr(node, method)(*params)
+
+    def move(self, node, node_id):
+        """Gives a position a new ring ID. Caller holds the lock."""
+        del self.vnodes[node.node_id]
+        node.node_id = node_id
+        node.me = {'node_id': node_id, 'ip': self.ip, 'port': self.port}
+        self.vnodes[node_id] = node
+
+    # Versions, shared by the positions since they share the store
+
+    def next_version(self):
+        """Returns a version newer than every one handed out so far. Caller holds the lock."""
+        self.last_version = max(time.time_ns(), self.last_version + 1)
+        return self.last_version
+
+    def entry_version(self, key_hash, key):
+        """Returns the version of a stored key; keys written before this start report boot_version. Caller holds the lock."""
+        return self.store.versions.get((key_hash, key), self.boot_version)
+
+    def apply_copy(self, key_hash, key, value, version=None):
+        """Stores a copy of a key sent by another node, keeping its version, unless ours is newer. Caller holds the lock.
+
+        Copies from nodes that send no version count as new writes.
+        """
+        if version is None:
+            version = self.next_version()
+        current = self.store.versions.get((key_hash, key))
+        if current is not None and current >= version:
+            return  # Already current, e.g. reloaded from our log after a restart
+        self.store.put(key_hash, key, value, version)
+        self.last_version = max(self.last_version, version)
+
+    def leave(self):
+        """Takes every position out of the ring. Keys move only where a range passes to another host."""
+        for node in list(self.vnodes.values()):
+            node.leave()
+
+    def store_size(self):
+        with self.lock:
+            return len(self.store)
+
+    def inflight(self):
+        return self.server.inflight if self.server else 0
+
+    def served(self):
+        return self.server.served if self.server else 0
+
+    def start_server(self):
+        """Starts the XML-RPC server."""
+        log.info("Starting server for %s positions on port %s with %s workers", len(self.vnodes), self.port, max_workers)
+        self.server = ThreadPoolXMLRPCServer(self, (self.ip, int(self.port)), max_workers, request_queue_size,
+                                             requestHandler=KeepAliveRequestHandler, logRequests=False, allow_none=True)
+        Metrics.gauge("store_keys", self.store_size)
+        Metrics.gauge("rpc_inflight", self.inflight)
+        Pool.pool.observers.append(self.observe_peer)
+        for task in schedule:
+            Metrics.gauge(f"{task}_interval_seconds", lambda task=task: self.first.intervals[task])
+        Metrics.describe("lookup_hops", "Hops taken by iterative lookups started on this node")
+        Metrics.describe("rpc_client_seconds", "Latency of calls this node made, by peer")
+        Metrics.describe("rpc_served_seconds", "Time spent serving calls, by method")
+
+        log.info("Nodes %s listening on port %s", list(self.vnodes), self.port)
+        self.server.serve_forever()
+
+class KeepAliveRequestHandler(SimpleXMLRPCRequestHandler):
+    """Serves several XML-RPC requests per connection so peers can reuse pooled connections."""
+    protocol_version = "HTTP/1.1"
+    timeout = keepalive_timeout
+
+    def do_GET(self):
+        """Serves the node's metrics in the Prometheus text format at /metrics."""
+        if self.path != "/metrics":
+            self.report_404()
+            return
+        body = Metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_error(self, format, *args):
+        # An idle keep-alive connection timing out is expected, not an error
+        if not format.startswith("Request timed out"):
+            super().log_error(format, *args)
+
+class ThreadPoolXMLRPCServer(SimpleXMLRPCServer):
+    """XML-RPC server that hands each request to a bounded pool of worker threads.
+
+    Connections that open with Wire.MAGIC speak the binary protocol instead. Between requests they
+    are parked in a selector, and a worker is only taken once the next request arrives.
+    """
+
+    def __init__(self, host, addr, workers, queue_size, **kwargs):
+        self.host = host
+        self.request_queue_size = queue_size
+        super().__init__(addr, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chord-rpc")
+        self.inflight = 0  # Calls being dispatched right now, reported to clients as load
+        self.served = 0  # Calls dispatched since startup
+        self.inflight_lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.parked = {}  # Idle binary socket -> monotonic time it was parked
+        self.parked_lock = threading.Lock()
+        threading.Thread(target=self.watch_parked, daemon=True, name="chord-parked").start()
+
+    def _dispatch(self, method, params, target=None):
+        """Runs a call on the position named by target; calls that name none go to the first."""
+        with self.inflight_lock:
+            self.inflight += 1
+            self.served += 1
+        try:
+            with Metrics.timer("rpc_served_seconds", method=method):
+                return self.host.invoke(self.host.vnodes.get(target, self.host.first), method, params)
+        except Exception:
+            Metrics.inc("rpc_served_errors_total", method=method)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight -= 1
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            request.settimeout(keepalive_timeout)
+            if Wire.peek_magic(request, keepalive_timeout):
+                reader = Wire.SocketReader(request)
+                reader.read(len(Wire.MAGIC))
+                self.serve_binary(request, reader)
+                return
+        except OSError:
+            self.shutdown_request(request)
+            return
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def serve_binary(self, sock, reader):
+        """Answers the requests waiting on a binary connection, then parks it until the next one arrives."""
+        while True:
+            if not Wire.serve_request(sock, reader, self._dispatch):
+                self.shutdown_request(sock)
+                return
+            if not reader.buffer:
+                break
+        with self.parked_lock:
+            self.parked[sock] = time.monotonic()
+            self.selector.register(sock, selectors.EVENT_READ, reader)
+
+    def watch_parked(self):
+        """Hands parked connections that became readable to a worker, and closes those idle too long."""
+        while True:
+            ready = self.selector.select(timeout=1)
+            now = time.monotonic()
+            with self.parked_lock:
+                for key, _ in ready:
+                    self.selector.unregister(key.fileobj)
+                    del self.parked[key.fileobj]
+                    self.executor.submit(self.serve_binary, key.fileobj, key.data)
+                idle = [sock for sock, since in self.parked.items() if now - since > keepalive_timeout]
+                for sock in idle:
+                    self.selector.unregister(sock)
+                    del self.parked[sock]
+            for sock in idle:
+                self.shutdown_request(sock)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+def user_input_loop(host):
     """Handles user input to join other nodes."""
-    
-    if port != 3000:
-        print("Joining Node 3000...")
-        join({'node_id': 3000, 'ip': 'localhost', 'port': '3000'})
-
-def stabilize_loop():
-    """Periodically stabilizes the node."""
-    while True:
-        # print(f"Stabilizing Node {node_id}...")
-        stabilize()
-        fix_fingers()
-        for i in range(m):
-            print(f"{i} {finger_table[i]['node_id']}")
-        print_data()
-        print(f"Predecessor of Node {node_id}: {predecessor}")
-        print(f"Successor of Node {node_id}: {successor}")
-        print("--------------------")
-        time.sleep(5)
+
+    if host.port != 3000:
+        log.info("Joining Node %s...", bootstrap_node['port'])
+        host.first.join(bootstrap_node)
+    for node in list(host.vnodes.values())[1:]:
+        # The other positions join through the first, which is in the ring by now
+        node.join(host.first.me)
 
 if __name__ == '__main__':
+    host = Host(ip, input("Enter port number: "))
     try:
         # Start the XML-RPC server in a separate thread
-        server_thread = threading.Thread(target=start_server)
+        server_thread = threading.Thread(target=host.start_server)
         server_thread.daemon = True  # Daemonize thread to allow exit
         server_thread.start()
 
         # Start the user input loop
-        user_input_loop()
-        stabilize_loop()
+        user_input_loop(host)
+        for node in list(host.vnodes.values())[1:]:
+            threading.Thread(target=node.stabilize_loop, daemon=True, name=f"chord-maintenance-{node.index}").start()
+        host.first.stabilize_loop()
     except KeyboardInterrupt:
-        if predecessor is not None:
-            xmlrpc.client.ServerProxy(f"http://{predecessor['ip']}:{predecessor['port']}").suc_update(successor)
-        if successor is not None:
-            xmlrpc.client.ServerProxy(f"http://{successor['ip']}:{successor['port']}").pred_update(predecessor)
-        # transfer keys to successor
-        for k, v in data.items():
-            xmlrpc.client.ServerProxy(f"http://{successor['ip']}:{successor['port']}").put(k, v)
-        print("Exiting...")
+        host.leave()
+        host.store.close()
+        log.info("Exiting...")
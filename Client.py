@@ -1,67 +1,374 @@
+from concurrent.futures import ThreadPoolExecutor
 import xmlrpc.client
-import hashlib
-
-def hashFunction(key):
-    """Generates a hash for the given key."""
-    return int(hashlib.sha1(key.encode()).hexdigest(), 16) % 2 ** 6
+import Cache
+import Pool
+from Ring import hashFunction, is_between
+import bisect
+import threading
+import time
 
 # User-defined variables for connecting to the initial Chord node
 ip = 'localhost'
 port = input("Enter the port of the node you want to connect to: ")
-server_url = f"http://{ip}:{port}"
+entry_node = {'ip': ip, 'port': port}
+max_hops = 32  # Give up on a lookup after this many hops
+lookup_deadline = 2  # Seconds a whole lookup may take before it gives up
+max_ring_size = 4096  # Stop walking the ring after this many nodes
+batch_workers = 8  # Owners contacted in parallel by put_many/get_many
+
+route_ttl = 30  # Seconds a learned node range is trusted before looking it up again
+read_mode = "primary"  # "primary" reads from the owner; "nearest" or "least_loaded" pick any replica
+value_cache_size = 1024  # Values kept by this client; 0 turns the cache off
+value_cache_ttl = 2  # Seconds a cached value is served before asking its owner whether it changed
+
+ring_view = []  # Nodes sorted by node_id, as last seen by get_ring_view
+
+# Routing cache: owner node_id -> (node, start of its range, expiry time)
+route_cache = {}
+route_ids = []  # Sorted owner node_ids in route_cache
+route_lock = threading.Lock()
+
+replica_cache = {}  # owner node_id -> (nodes holding its keys, expiry time)
+peer_rtt = {}  # node_id -> smoothed seconds per replica read
+peer_load = {}  # node_id -> in-flight calls the node last reported
+
+value_cache = Cache.ValueCache(value_cache_size, value_cache_ttl, "client")  # (hash, key) -> value
+cache_executor = ThreadPoolExecutor(max_workers=2)  # Pushes fetched values to nodes on the lookup path
 
 try:
     # Connect to the Chord node
-    server = xmlrpc.client.ServerProxy(server_url)
-    print(f"Connected to Node on {server_url}")
+    server = Pool.connect(entry_node)
+    server.get_predecessor()
+    print(f"Connected to Node on {ip}:{port}")
 except Exception as e:
     print(f"Failed to connect to the node: {e}")
     exit(1)
 
+def learn_route(node, start):
+    """Remembers that node owns the range (start, node_id]."""
+    with route_lock:
+        if node['node_id'] not in route_cache:
+            bisect.insort(route_ids, node['node_id'])
+        route_cache[node['node_id']] = (node, start, time.monotonic() + route_ttl)
+
+def forget_route(node):
+    """Drops a cached range whose owner turned out to be wrong or dead."""
+    with route_lock:
+        if route_cache.pop(node['node_id'], None) is not None:
+            route_ids.remove(node['node_id'])
+
+def cached_owner(key_hash):
+    """Returns the cached owner of a hash, or None if no fresh range covers it."""
+    with route_lock:
+        if not route_ids:
+            return None
+        i = bisect.bisect_left(route_ids, key_hash) % len(route_ids)
+        node, start, expires = route_cache[route_ids[i]]
+        if time.monotonic() > expires:
+            route_ids.pop(i)
+            del route_cache[node['node_id']]
+            return None
+    if start == node['node_id'] or is_between(key_hash, start, node['node_id']):
+        return node
+    return None
+
+def locate(key_hash, exclude=()):
+    """Finds the owner of a hash, from the routing cache when possible."""
+    node = cached_owner(key_hash)
+    if node is not None and node['node_id'] not in exclude:
+        print(f"Routing cache hit: hash {key_hash} is on Node {node['node_id']}")
+        return node
+    return find_successor_of_key_hash(key_hash, exclude)
+
+def replicas_of(owner):
+    """Returns the nodes holding copies of the owner's keys, the owner first."""
+    cached = replica_cache.get(owner['node_id'])
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+    nodes = Pool.connect(owner).get_replicas()
+    replica_cache[owner['node_id']] = (nodes, time.monotonic() + route_ttl)
+    return nodes
+
+def rank_replicas(nodes):
+    """Orders replicas by read_mode. Nodes never measured sort first so every replica gets tried."""
+    if read_mode == "least_loaded":
+        return sorted(nodes, key=lambda n: (peer_load.get(n['node_id'], 0), peer_rtt.get(n['node_id'], 0)))
+    return sorted(nodes, key=lambda n: peer_rtt.get(n['node_id'], 0))
+
+def read_replica(key_hash, key, owner):
+    """Reads a key from the best replica of its owner, falling through to the others on failure."""
+    error = None
+    for node in rank_replicas(replicas_of(owner)):
+        started = time.monotonic()
+        try:
+            reply = Pool.connect(node).get_replica(key_hash, key)
+        except Exception as e:
+            print(f"Replica Node {node['node_id']} failed: {e}")
+            replica_cache.pop(owner['node_id'], None)
+            error = e
+            continue
+        rtt = time.monotonic() - started
+        previous = peer_rtt.get(node['node_id'])
+        peer_rtt[node['node_id']] = rtt if previous is None else 0.8 * previous + 0.2 * rtt
+        peer_load[node['node_id']] = reply['load']
+        return reply['value'], node
+    raise error or Exception(f"No replicas known for Node {owner['node_id']}")
+
 def find_successor_of_key(key):
     """Finds the successor node for a given key."""
+    key_hash = hashFunction(key)
+    print(f"Finding successor for key '{key}' (Hash: {key_hash})")
+    return find_successor_of_key_hash(key_hash)
+
+def find_successor_of_key_hash(key_hash, exclude=()):
+    """Finds the successor node for a hash, driving each lookup hop from the client."""
+    hop = walk(key_hash, exclude)
+    return hop and hop['node']
+
+def walk(key_hash, exclude=(), key=None):
+    """Drives a lookup hop by hop and returns the final hop, whose 'node' owns the hash and 'self' answered last.
+
+    Given the original key, stops early at a hop that returns a cached copy of its value under 'cached'.
+    """
+    deadline = time.monotonic() + lookup_deadline
+    exclude = list(exclude)
+
+    def ask(targets):
+        """Asks the first target for the next hop, hedging with the rest. Returns (node that answered, hop)."""
+        failed = []
+        try:
+            return Pool.hedged_call(targets, 'find_next_hop', key_hash, list(exclude), key, deadline=deadline,
+                                    failed=failed, delay=Pool.hedge_after(peer_rtt.get(targets[0].get('node_id'))))
+        finally:
+            for node in failed:
+                if 'node_id' in node:
+                    exclude.append(node['node_id'])
+                    forget_route(node)
+
     try:
-        key_hash = hashFunction(key)
-        print(f"Finding successor for key '{key}' (Hash: {key_hash})")
-        successor = server.find_successor(key_hash)
-        print(f"Successor found: Node {successor['node_id']} at {successor['ip']}:{successor['port']}")
-        return successor
+        responder, hop = ask([entry_node])
+        path = [hop['node']['node_id']]
+        while not hop['done'] and 'cached' not in hop:
+            if len(path) >= max_hops:
+                print(f"Lookup for hash {key_hash} gave up after {len(path)} hops")
+                return None
+            targets = [hop['node']] + ([hop['backup']] if 'backup' in hop else [])
+            try:
+                responder, hop = ask(targets)
+            except (xmlrpc.client.Fault, TimeoutError):
+                raise
+            except Exception as e:
+                # Ask the last live hop again, this time routing around the dead nodes
+                print(f"Node {targets[0]['node_id']} is not responding: {e}")
+                responder, hop = ask([responder])
+            path.append(hop['node']['node_id'])
+        if 'cached' in hop:
+            print(f"Lookup path cache hit at Node {hop['self']['node_id']} (path: {path})")
+            return hop
+        successor = hop['node']
+        # The last node asked knows the owner's range starts right after itself
+        learn_route(successor, hop['self']['node_id'])
+        print(f"Successor found: Node {successor['node_id']} at {successor['ip']}:{successor['port']} (path: {path})")
+        return hop
+    except TimeoutError:
+        print(f"Lookup for hash {key_hash} missed its {lookup_deadline}s deadline")
+        return None
     except Exception as e:
         print(f"Error finding successor: {e}")
         return None
 
 def put_data(key, value):
     """Stores a key-value pair in the Chord network."""
-    successor = find_successor_of_key(key)
-    if successor:
+    key_hash = hashFunction(key)
+    dead = []
+    for attempt in range(2):
+        successor = locate(key_hash, dead)
+        if not successor:
+            return
         try:
             # Connect to the successor node and store the data
-            successor_server_url = f"http://{successor['ip']}:{successor['port']}"
-            successor_server = xmlrpc.client.ServerProxy(successor_server_url)
-            key_hash = hashFunction(key)
+            successor_server = Pool.connect(successor)
             print(f"Storing key '{key}' (Hash: {key_hash}) with value '{value}' in Node {successor['node_id']}")
-            successor_server.put(key_hash, value)
+            version = successor_server.put(key_hash, key, value)
+            if version is not None:
+                value_cache.store((key_hash, key), value, version)
             print("Data stored successfully.")
+            return
+        except xmlrpc.client.Fault as e:
+            if e.faultCode != Pool.WRONG_OWNER:
+                print(f"Error storing data on successor node: {e}")
+                return
+            print(f"Node {successor['node_id']} no longer owns key '{key}', retrying lookup")
+            forget_route(successor)
         except Exception as e:
+            # The owner died; its first successor takes over the range
             print(f"Error storing data on successor node: {e}")
+            forget_route(successor)
+            dead.append(successor['node_id'])
+
+def push_to_path(node, key_hash, key, value, version):
+    """Leaves a copy of a value on a node of its lookup path so later lookups end there."""
+    try:
+        Pool.connect(node).cache_put(key_hash, key, value, version)
+    except Exception as e:
+        print(f"Could not cache key '{key}' on Node {node['node_id']}: {e}")
+
+def read_owner(successor, key_hash, key, cached):
+    """Reads a key from its owner as (value, version), revalidating a stale cached copy instead of refetching it."""
+    successor_server = Pool.connect(successor)
+    if cached is not None:
+        if successor_server.get_version(key_hash, key) == cached[1]:
+            print(f"Cached value of key '{key}' is still current")
+            value_cache.renew((key_hash, key))
+            return cached[0], cached[1]
+    print(f"Retrieving value for key '{key}' (Hash: {key_hash}) from Node {successor['node_id']}")
+    reply = successor_server.get_versioned(key_hash, key)
+    value_cache.store((key_hash, key), reply['value'], reply['version'])
+    return reply['value'], reply['version']
 
 def get_data(key):
     """Retrieves a value for a given key from the Chord network."""
-    successor = find_successor_of_key(key)
-    if successor:
+    key_hash = hashFunction(key)
+    cached = value_cache.lookup((key_hash, key))
+    if cached is not None and cached[2]:
+        print(f"Value cache hit for key '{key}': {cached[0]}")
+        return cached[0]
+    dead = []
+    for attempt in range(2):
+        via = None
+        if read_mode == "primary" and cached is None and cached_owner(key_hash) is None:
+            # A full lookup; a node on the path may already hold a copy
+            hop = walk(key_hash, dead, key)
+            if hop and 'cached' in hop:
+                value_cache.store((key_hash, key), hop['cached']['value'], hop['cached']['version'])
+                print(f"Value retrieved: {hop['cached']['value']}")
+                return hop['cached']['value']
+            successor = hop and hop['node']
+            via = hop and hop['self']
+        else:
+            successor = locate(key_hash, dead)
+        if not successor:
+            return None
         try:
-            # Connect to the successor node and retrieve the data
-            successor_server_url = f"http://{successor['ip']}:{successor['port']}"
-            successor_server = xmlrpc.client.ServerProxy(successor_server_url)
-            key_hash = hashFunction(key)
-            print(f"Retrieving value for key '{key}' (Hash: {key_hash}) from Node {successor['node_id']}")
-            value = successor_server.get(key_hash)
+            if read_mode == "primary":
+                value, version = read_owner(successor, key_hash, key, cached)
+                if via is not None and via['node_id'] != successor['node_id']:
+                    cache_executor.submit(push_to_path, via, key_hash, key, value, version)
+            else:
+                value, replica = read_replica(key_hash, key, successor)
+                print(f"Retrieved key '{key}' (Hash: {key_hash}) from replica Node {replica['node_id']}")
             if value is not None:
                 print(f"Value retrieved: {value}")
             else:
                 print(f"No value found for key: {key}")
+            return value
+        except xmlrpc.client.Fault as e:
+            if e.faultCode != Pool.WRONG_OWNER:
+                print(f"Error retrieving data from successor node: {e}")
+                return None
+            print(f"Node {successor['node_id']} no longer owns key '{key}', retrying lookup")
+            forget_route(successor)
         except Exception as e:
+            # The owner died; its first successor holds a replica and takes over the range
             print(f"Error retrieving data from successor node: {e}")
+            forget_route(successor)
+            dead.append(successor['node_id'])
+
+def get_ring_view(refresh=False):
+    """Returns the ring as a list of nodes sorted by node_id, walking successor pointers once."""
+    global ring_view
+    if ring_view and not refresh:
+        return ring_view
+    seen = {}
+    node = server.get_successor()
+    while node['node_id'] not in seen and len(seen) < max_ring_size:
+        seen[node['node_id']] = node
+        node = Pool.connect(node).get_successor()
+    ring_view = sorted(seen.values(), key=lambda n: n['node_id'])
+    for i, node in enumerate(ring_view):
+        learn_route(node, ring_view[i - 1]['node_id'])
+    print(f"Ring view refreshed: {[n['node_id'] for n in ring_view]}")
+    return ring_view
+
+def owner_of(key_hash, view):
+    """Returns the node in the ring view responsible for the hash."""
+    i = bisect.bisect_left(view, key_hash, key=lambda n: n['node_id'])
+    return view[i % len(view)]
+
+def group_by_owner(entries, view):
+    """Groups [hash, ...] entries by owning node. Returns {node_id: (node, [entry, ...])}."""
+    groups = {}
+    for entry in entries:
+        node = owner_of(entry[0], view)
+        groups.setdefault(node['node_id'], (node, []))[1].append(entry)
+    return groups
+
+def put_many(items):
+    """Stores many key-value pairs with one batched RPC per owning node."""
+    entries = [[hashFunction(key), key, value] for key, value in items.items()]
+    for key_hash, key, _ in entries:
+        value_cache.invalidate((key_hash, key))
+    try:
+        groups = group_by_owner(entries, get_ring_view())
+    except Exception as e:
+        print(f"Error reading the ring: {e}")
+        return
+
+    misrouted = []
+    with ThreadPoolExecutor(max_workers=batch_workers) as executor:
+        futures = {executor.submit(Pool.connect(node).put_many, batch): (node, batch) for node, batch in groups.values()}
+        for future, (node, batch) in futures.items():
+            try:
+                misrouted.extend(future.result())
+            except Exception as e:
+                print(f"Error storing batch on Node {node['node_id']}: {e}")
+                misrouted.extend(key_hash for key_hash, _, _ in batch)
+    if misrouted:
+        # The ring changed under us; send the stragglers through a fresh view
+        get_ring_view(refresh=True)
+        retry = set(misrouted)
+        for key_hash, key, value in entries:
+            if key_hash in retry:
+                put_data(key, value)
+    print(f"Stored {len(items)} keys on {len(groups)} nodes ({len(misrouted)} retried).")
+
+def get_many(keys):
+    """Retrieves many keys with one batched RPC per owning node. Returns {key: value}."""
+    entries = [[hashFunction(key), key] for key in dict.fromkeys(keys)]
+    try:
+        groups = group_by_owner(entries, get_ring_view())
+    except Exception as e:
+        print(f"Error reading the ring: {e}")
+        return {}
+
+    values = {}
+    misrouted = []
+    with ThreadPoolExecutor(max_workers=batch_workers) as executor:
+        futures = {executor.submit(Pool.connect(node).get_many, batch): (node, batch) for node, batch in groups.values()}
+        for future, (node, batch) in futures.items():
+            try:
+                reply = future.result()
+            except Exception as e:
+                print(f"Error retrieving batch from Node {node['node_id']}: {e}")
+                misrouted.extend(key_hash for key_hash, _ in batch)
+                continue
+            misrouted.extend(reply['misrouted'])
+            values.update((key, value) for (_, key), value in zip(batch, reply['values']))
+    if misrouted:
+        get_ring_view(refresh=True)
+        retry = set(misrouted)
+        for key_hash, key in entries:
+            if key_hash in retry:
+                values[key] = None
+                node = locate(key_hash)
+                if node:
+                    try:
+                        values[key] = Pool.connect(node).get_many([[key_hash, key]])['values'][0]
+                    except Exception as e:
+                        print(f"Error retrieving data from successor node: {e}")
+    for key, value in values.items():
+        print(f"{key}: {value}")
+    return values
 
 # Main client loop
 if __name__ == '__main__':
@@ -69,7 +376,9 @@ if __name__ == '__main__':
         print("\nOptions:")
         print("1. Store data (put)")
         print("2. Retrieve data (get)")
-        print("3. Exit")
+        print("3. Store many (put_many)")
+        print("4. Retrieve many (get_many)")
+        print("5. Exit")
         choice = input("Choose an option: ").strip()
 
         if choice == '1':
@@ -82,6 +391,15 @@ if __name__ == '__main__':
             get_data(key)
         
         elif choice == '3':
+            pairs = input("Enter key=value pairs separated by commas: ")
+            items = dict(pair.split('=', 1) for pair in pairs.split(',') if '=' in pair)
+            put_many({key.strip(): value.strip() for key, value in items.items()})
+
+        elif choice == '4':
+            keys = input("Enter keys separated by commas: ")
+            get_many([key.strip() for key in keys.split(',') if key.strip()])
+
+        elif choice == '5':
             print("Exiting client.")
             break
         
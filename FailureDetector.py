@@ -0,0 +1,51 @@
+import collections
+import math
+import threading
+import time
+
+# Phi accrual failure detector (Hayashibara et al.). Any sign of life from a peer, such as a reply to
+# an RPC or a notify it sent us, counts as a heartbeat. phi grows the longer a peer stays silent,
+# measured against how often it was heard from before, so callers only ping peers that are overdue.
+
+class PhiAccrual:
+    def __init__(self, window=100, min_std=0.5, pause=1, first_interval=5):
+        self.window = window  # Heartbeat intervals kept per peer
+        self.min_std = min_std  # Seconds; keeps a very regular peer from being suspected after a small delay
+        self.pause = pause  # Seconds of silence tolerated on top of the usual interval
+        self.first_interval = first_interval  # Interval assumed until a peer has been heard from twice
+        self.peers = {}  # peer -> [time of the last heartbeat, deque of intervals]
+        self.lock = threading.Lock()
+
+    def heartbeat(self, peer):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.peers.get(peer)
+            if entry is None:
+                self.peers[peer] = [now, collections.deque([self.first_interval], maxlen=self.window)]
+                return
+            entry[1].append(now - entry[0])
+            entry[0] = now
+
+    def phi(self, peer):
+        """Returns how suspicious the peer's silence is: phi 1 is about a 10% chance it is still alive, 2 is 1%, and so on.
+
+        Peers never heard from are infinitely suspicious.
+        """
+        with self.lock:
+            entry = self.peers.get(peer)
+            if entry is None:
+                return math.inf
+            last, intervals = entry[0], list(entry[1])
+        mean = sum(intervals) / len(intervals)
+        std = max(math.sqrt(sum((x - mean) ** 2 for x in intervals) / len(intervals)), self.min_std)
+        # Logistic approximation of the normal CDF, as used by Akka and Cassandra
+        y = (time.monotonic() - last - mean - self.pause) / std
+        y = min(max(y, -10), 10)  # Beyond this phi is already 0 or about 37, and exp() would overflow
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        if y > 0:
+            return -math.log10(e / (1 + e))
+        return -math.log10(1 - 1 / (1 + e))
+
+    def forget(self, peer):
+        with self.lock:
+            self.peers.pop(peer, None)
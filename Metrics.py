@@ -0,0 +1,114 @@
+import bisect
+import threading
+import time
+
+# In-process counters, gauges and histograms for a node. Recording is a dict update under one
+# lock; formatting happens only when someone asks for the numbers.
+
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)  # Seconds
+hop_buckets = (1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 24, 32)
+
+lock = threading.Lock()
+counters = {}  # (name, labels) -> value
+histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+bucket_bounds = {}  # Histogram name -> its bucket upper bounds
+gauges = {}  # name -> function returning the current value
+descriptions = {}  # name -> help text
+
+def key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def describe(name, text):
+    descriptions[name] = text
+
+def inc(name, value=1, **labels):
+    """Adds value to a counter."""
+    k = key(name, labels)
+    with lock:
+        counters[k] = counters.get(k, 0) + value
+
+def observe(name, value, buckets=latency_buckets, **labels):
+    """Records one sample in a histogram. A histogram keeps the buckets it was first observed with."""
+    k = key(name, labels)
+    with lock:
+        bounds = bucket_bounds.setdefault(name, buckets)
+        h = histograms.get(k)
+        if h is None:
+            h = histograms[k] = [0] * (len(bounds) + 2)
+        h[bisect.bisect_left(bounds, value)] += 1
+        h[-1] += value
+
+def gauge(name, fn):
+    """Registers a gauge whose value is read from fn when metrics are collected."""
+    gauges[name] = fn
+
+class timer:
+    """Context manager that observes the time spent inside it, in seconds."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+def snapshot():
+    """Returns every metric as plain data, keyed by Prometheus-style series names."""
+    with lock:
+        counter_items = list(counters.items())
+        histogram_items = [(k, list(h)) for k, h in histograms.items()]
+    result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    for (name, labels), value in counter_items:
+        result['counters'][name + label_text(labels)] = value
+    for name, fn in list(gauges.items()):
+        result['gauges'][name] = fn()
+    for (name, labels), h in histogram_items:
+        bounds = bucket_bounds[name]
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(list(bounds) + ["+Inf"], h[:-1]):
+            cumulative += count
+            buckets.append([str(bound), cumulative])
+        result['histograms'][name + label_text(labels)] = {'count': cumulative, 'sum': h[-1], 'buckets': buckets}
+    return result
+
+def render():
+    """Formats every metric in the Prometheus text exposition format."""
+    snap = snapshot()
+    lines = []
+    typed = set()
+
+    def header(series, kind):
+        name = series.split("{", 1)[0]
+        if name not in typed:
+            typed.add(name)
+            if name in descriptions:
+                lines.append(f"# HELP {name} {descriptions[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        return name
+
+    for series, value in sorted(snap['counters'].items()):
+        header(series, "counter")
+        lines.append(f"{series} {value}")
+    for series, value in sorted(snap['gauges'].items()):
+        header(series, "gauge")
+        lines.append(f"{series} {value}")
+    for series, h in sorted(snap['histograms'].items()):
+        name = header(series, "histogram")
+        labels = series[len(name):].strip("{}")
+        sep = "," if labels else ""
+        for bound, count in h['buckets']:
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+        suffix = "{" + labels + "}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {h['sum']}")
+        lines.append(f"{name}_count{suffix} {h['count']}")
+    return "\n".join(lines) + "\n"
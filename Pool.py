@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import xmlrpc.client
+import os
+import threading
+import time
+import Metrics
+import Wire
+
+# Pool settings, shared by nodes and clients
+pool_size = 4  # Idle connections kept per peer
+idle_timeout = 4  # Seconds before an idle connection is closed, below the server's keep-alive
+rpc_timeout = 5  # Seconds to wait on a single RPC before treating the peer as dead
+transport = os.environ.get("CHORD_TRANSPORT", "binary")  # "binary" (Wire.py) or "xmlrpc" for older nodes
+hedge_delay = 0.05  # Seconds to wait on a call before sending it to the next candidate as well, for peers with no RTT yet
+hedge_rtt_factor = 3  # With a measured RTT, hedge once a call has taken this many times the peer's usual round trip
+hedge_min_delay = 0.002  # But never sooner than this, so a very close peer doesn't double every call
+hedge_workers = 32  # Calls in flight at once across all hedged requests
+
+# Fault codes shared by nodes and clients
+WRONG_OWNER = 410  # The key is outside the node's range; the caller's routing is stale
+UNDER_REPLICATED = 503  # The write was stored on fewer replicas than its write_ack mode requires
+
+def dump_int(marshaller, value, write):
+    """Marshals ints, falling back to the <biginteger> extension for ring IDs wider than 32 bits."""
+    if xmlrpc.client.MININT <= value <= xmlrpc.client.MAXINT:
+        write(f"<value><int>{value}</int></value>\n")
+    else:
+        write(f"<value><biginteger>{value}</biginteger></value>\n")
+
+# The stock unmarshaller already reads <biginteger>; teach the marshaller to write it
+xmlrpc.client.Marshaller.dispatch[int] = dump_int
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """HTTP/1.1 keep-alive transport whose socket operations time out."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+def open_proxy(ip, port, timeout, kind=None):
+    """Opens a proxy to ip:port over the given transport, "binary" or "xmlrpc"."""
+    kind = kind or transport
+    if kind == "binary":
+        return Wire.BinaryProxy(ip, port, timeout)
+    if kind == "xmlrpc":
+        return xmlrpc.client.ServerProxy(f"http://{ip}:{port}",
+                                         transport=TimeoutTransport(timeout), allow_none=True)
+    raise ValueError(f"Unknown transport: {kind}")
+
+class ConnectionPool:
+    """Keeps a bounded set of persistent connections per peer."""
+
+    def __init__(self, size=pool_size, idle=idle_timeout, timeout=rpc_timeout, kind=None):
+        self.size = size
+        self.idle = idle
+        self.timeout = timeout
+        self.kind = kind  # Transport for new connections; None follows the module setting
+        self.idle_proxies = {}  # (ip, port) -> [(proxy, last_used), ...]
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+        self.observers = []  # Called as fn(node, ok) after every call, e.g. to feed a failure detector
+
+    def acquire(self, node):
+        """Returns an open connection to the node, reusing an idle one if possible."""
+        peer = (node['ip'], str(node['port']))
+        now = time.monotonic()
+        stale = []
+        proxy = None
+        with self.lock:
+            if now - self.last_sweep > self.idle:
+                stale.extend(self.sweep(now))
+            idle = self.idle_proxies.get(peer, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used <= self.idle:
+                    proxy = candidate
+                    break
+                stale.append(candidate)
+        for p in stale:
+            p('close')()
+        if proxy is None:
+            proxy = open_proxy(peer[0], peer[1], self.timeout, self.kind)
+        return proxy
+
+    def release(self, node, proxy):
+        """Returns a healthy connection to the pool, closing it if the pool is full."""
+        peer = (node['ip'], str(node['port']))
+        with self.lock:
+            idle = self.idle_proxies.setdefault(peer, [])
+            if len(idle) < self.size:
+                idle.append((proxy, time.monotonic()))
+                return
+        proxy('close')()
+
+    def invalidate(self, node):
+        """Closes every idle connection to a peer that failed."""
+        peer = (node['ip'], str(node['port']))
+        with self.lock:
+            idle = self.idle_proxies.pop(peer, [])
+        for proxy, _ in idle:
+            proxy('close')()
+
+    def sweep(self, now):
+        """Removes connections idle for too long and returns them. Caller holds the lock."""
+        stale = []
+        for peer in list(self.idle_proxies):
+            fresh = []
+            for proxy, last_used in self.idle_proxies[peer]:
+                if now - last_used <= self.idle:
+                    fresh.append((proxy, last_used))
+                else:
+                    stale.append(proxy)
+            if fresh:
+                self.idle_proxies[peer] = fresh
+            else:
+                del self.idle_proxies[peer]
+        self.last_sweep = now
+        return stale
+
+    def evict_idle(self):
+        """Closes connections that have been idle longer than the idle timeout."""
+        with self.lock:
+            stale = self.sweep(time.monotonic())
+        for proxy in stale:
+            proxy('close')()
+
+    def call(self, node, method, *args, timeout=None):
+        """Calls a method on the node over a pooled connection.
+
+        timeout shortens the socket timeout for this call; XML-RPC connections keep the pool's.
+        """
+        proxy = self.acquire(node)
+        peer = f"{node['ip']}:{node['port']}"
+        started = time.perf_counter()
+        try:
+            if isinstance(proxy, Wire.BinaryProxy):
+                # Name the ring position as well, since one process may host several
+                result = proxy._request(method, args, node.get('node_id'), timeout)
+            else:
+                result = getattr(proxy, method)(*args)
+        except xmlrpc.client.Fault:
+            # The peer answered with an application error; the connection is still good
+            Metrics.observe("rpc_client_seconds", time.perf_counter() - started, peer=peer)
+            self.release(node, proxy)
+            self.notify_observers(node, True)
+            raise
+        except Exception:
+            Metrics.inc("rpc_client_errors_total", peer=peer)
+            proxy('close')()
+            self.invalidate(node)
+            self.notify_observers(node, False)
+            raise
+        Metrics.observe("rpc_client_seconds", time.perf_counter() - started, peer=peer)
+        self.release(node, proxy)
+        self.notify_observers(node, True)
+        return result
+
+    def notify_observers(self, node, ok):
+        for observer in self.observers:
+            observer(node, ok)
+
+class PeerProxy:
+    """ServerProxy look-alike that sends every call through a connection pool."""
+
+    def __init__(self, pool, node, timeout=None):
+        self.pool = pool
+        self.node = node
+        self.timeout = timeout
+
+    def __getattr__(self, method):
+        return lambda *args: self.pool.call(self.node, method, *args, timeout=self.timeout)
+
+pool = ConnectionPool()
+hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="chord-hedge")
+
+def connect(node, timeout=None):
+    """Returns a proxy for the node that uses the shared connection pool."""
+    return PeerProxy(pool, node, timeout)
+
+def hedge_after(rtt):
+    """Returns how long to wait on a peer before hedging, given its smoothed RTT in seconds or None if unmeasured."""
+    if rtt is None:
+        return hedge_delay
+    return max(hedge_rtt_factor * rtt, hedge_min_delay)
+
+def hedged_call(candidates, method, *args, deadline=None, failed=None, delay=None):
+    """Calls a method on the first candidate, adding the next one each time delay passes without an answer.
+
+    Returns (candidate, result) for the first call to succeed. deadline is a time.monotonic() value;
+    raises TimeoutError once it passes, or the first error if every candidate fails. Candidates that
+    failed are appended to failed. A Fault is an answer from a live peer, so it is raised at once without
+    marking the peer failed. Calls still running when this returns are left to finish on their own.
+    delay defaults to hedge_delay; callers that know the first candidate's RTT pass hedge_after(rtt).
+    """
+    delay = hedge_delay if delay is None else delay
+    queue = list(candidates)
+    pending = {}
+    errors = []
+    while queue or pending:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        if queue:
+            node = queue.pop(0)
+            if pending:
+                Metrics.inc("hedged_requests_total", method=method)
+            pending[hedge_executor.submit(pool.call, node, method, *args, timeout=remaining)] = node
+        if queue:
+            timeout = delay if remaining is None else min(delay, remaining)
+        else:
+            timeout = remaining
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            node = pending.pop(future)
+            try:
+                result = future.result()
+            except xmlrpc.client.Fault:
+                raise
+            except Exception as e:
+                errors.append(e)
+                if failed is not None:
+                    failed.append(node)
+                continue
+            if node is not candidates[0]:
+                Metrics.inc("hedge_wins_total", method=method)
+            return node, result
+    if pending or not errors:
+        raise TimeoutError(f"{method} missed its deadline")
+    raise errors[0]
@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+# Identifier space shared by nodes and clients. Every process in a ring must use the same width.
+max_bits = 160  # Width of a SHA-1 digest
+m = int(os.environ.get("CHORD_BITS", max_bits))
+if not 1 <= m <= max_bits:
+    raise ValueError(f"CHORD_BITS must be between 1 and {max_bits}, got {m}")
+nodes = 2 ** m
+
+def hashFunction(key):
+    """Generates a hash for the given key."""
+    return int(hashlib.sha1(key.encode()).hexdigest(), 16) % nodes
+
+def vnode_id(ip, port, index):
+    """Ring ID of a host's index-th virtual node. The first one gets the ID of a host with a single position."""
+    if index == 0:
+        return hashFunction(ip + str(port))
+    return hashFunction(f"{ip}{port}#{index}")
+
+def is_between(x, a, b, ring_size=nodes):
+    """Check if x is between a and b on a modular ring of size ring_size."""
+    if a < b:
+        return a < x <= b
+    else:  # Handle the case when there's a wrap-around in the ring
+        return x > a or x <= b
@@ -0,0 +1,263 @@
+import argparse
+import bisect
+import logging
+import random
+import statistics
+import threading
+import time
+import xmlrpc.client
+import Chord
+from Ring import m, nodes, hashFunction
+
+# In-process ring simulator. Every host is a Chord.Host whose RPCs are delivered by calling the
+# target node's method directly, so thousands of nodes fit in one process and run Chord.py's own
+# join, stabilize, notify, fix_fingers, replication, handoff and lookup code. A host may hold
+# several positions (virtual nodes), as with CHORD_VNODES.
+#
+# The simulator drives maintenance in rounds instead of Chord.py's timers, and calls answer at
+# once, so hedging, proximity routing and the phi accrual detector's timing are not modelled.
+# Rebalancing is not run.
+#
+#   python Simulator.py --nodes 1000 --keys 10000 --join 20 --fail 0.1
+
+class Network:
+    """In-memory transport between simulated hosts. Counts RPCs and lookup hops."""
+
+    def __init__(self):
+        self.hosts = {}  # (ip, port) -> SimHost
+        self.rpcs = 0
+        self.hops = 0  # find_next_hop calls, one per remote lookup step
+        self.lock = threading.Lock()  # Replicas are written from Chord.py's replication threads
+
+    def deliver(self, node, method, args):
+        with self.lock:
+            self.rpcs += 1
+            if method == 'find_next_hop':
+                self.hops += 1
+        host = self.hosts.get((node['ip'], str(node['port'])))
+        if host is None or host.dead:
+            raise ConnectionError(f"Node {node['node_id']} is down")
+        return host.invoke(host.vnodes.get(node.get('node_id'), host.first), method, args)
+
+class SimProxy:
+    """Proxy look-alike that sends calls through the simulated network and reports replies to the caller's failure detector."""
+
+    def __init__(self, host, node):
+        self.host = host
+        self.node = node
+
+    def __getattr__(self, method):
+        def call(*args):
+            try:
+                result = self.host.network.deliver(self.node, method, args)
+            except xmlrpc.client.Fault:
+                self.host.observe_peer(self.node, True)
+                raise
+            except Exception:
+                self.host.observe_peer(self.node, False)
+                raise
+            self.host.observe_peer(self.node, True)
+            return result
+        return call
+
+class SimHost(Chord.Host):
+    """A host whose calls go through the simulated network instead of sockets."""
+
+    def __init__(self, network, index, count):
+        super().__init__("sim", index, count, engine="memory")
+        self.network = network
+        self.dead = False
+        network.hosts[(self.ip, self.port)] = self
+
+    def connect(self, node, timeout=None):
+        return SimProxy(self, node)
+
+    def hedged_call(self, candidates, method, *args, deadline=None, failed=None, delay=None):
+        """Tries the candidates in turn. Simulated calls answer at once, so there is nothing to hedge."""
+        errors = []
+        for node in candidates:
+            try:
+                return node, getattr(self.connect(node), method)(*args)
+            except xmlrpc.client.Fault:
+                raise
+            except Exception as e:
+                errors.append(e)
+                if failed is not None:
+                    failed.append(node)
+        raise errors[0]
+
+class Simulator:
+    def __init__(self, vnodes=1, seed=0):
+        self.network = Network()
+        self.vnodes = vnodes
+        self.random = random.Random(seed)
+        self.next_index = 0
+
+    def add_host(self):
+        host = SimHost(self.network, self.next_index, self.vnodes)
+        self.next_index += 1
+        return host
+
+    def live_hosts(self):
+        return [h for h in self.network.hosts.values() if not h.dead]
+
+    def live_nodes(self):
+        return [node for h in self.live_hosts() for node in h.vnodes.values()]
+
+    def oracle(self):
+        """Returns the sorted live node IDs and a map from ID to node reference."""
+        by_id = {node.node_id: node.me for node in self.live_nodes()}
+        return sorted(by_id), by_id
+
+    @staticmethod
+    def owner(ids, key):
+        """The first ID at or after key, wrapping around."""
+        return ids[bisect.bisect_left(ids, key) % len(ids)]
+
+    def build(self, count):
+        """Creates count hosts with correct successors, predecessors and fingers, skipping the join protocol."""
+        for _ in range(count):
+            self.add_host()
+        ids, by_id = self.oracle()
+        for node in self.live_nodes():
+            i = bisect.bisect_left(ids, node.node_id)
+            node.successor = by_id[ids[(i + 1) % len(ids)]]
+            node.predecessor = by_id[ids[i - 1]]
+            node.successor_list = [by_id[ids[(i + j) % len(ids)]] for j in range(1, Chord.successor_list_size + 1)
+                                   if ids[(i + j) % len(ids)] != node.node_id]
+            node.finger_table = [by_id[self.owner(ids, (node.node_id + 2 ** k) % nodes)] for k in range(m)]
+            node.invalidate_routes()
+
+    def join(self, count):
+        """Adds count hosts through the join protocol, each bootstrapping from a random live node."""
+        for _ in range(count):
+            bootstrap = self.random.choice(self.live_nodes()).me
+            host = self.add_host()
+            for node in host.vnodes.values():
+                node.join(bootstrap)
+
+    def fail(self, fraction):
+        """Crashes a random fraction of the hosts without warning. Returns how many died."""
+        victims = self.random.sample(self.live_hosts(), int(len(self.live_hosts()) * fraction))
+        for host in victims:
+            host.dead = True
+        return len(victims)
+
+    def round(self):
+        """Runs one pass of stabilize, fix_fingers and check_predecessor on every live node."""
+        for node in self.live_nodes():
+            for step in (node.stabilize, node.fix_fingers, node.check_predecessor):
+                try:
+                    step()
+                except Exception:
+                    pass  # Chord.py's scheduler retries a failed task on its next run; so does the next round
+
+    def ring_ok(self):
+        """Checks every live node's successor and predecessor against the true ring."""
+        ids, _ = self.oracle()
+        for node in self.live_nodes():
+            i = bisect.bisect_left(ids, node.node_id)
+            if node.successor['node_id'] != ids[(i + 1) % len(ids)]:
+                return False
+            if node.predecessor is None or node.predecessor['node_id'] != ids[i - 1]:
+                return False
+        return True
+
+    def finger_accuracy(self):
+        ids, _ = self.oracle()
+        right = total = 0
+        for node in self.live_nodes():
+            for k, finger in enumerate(node.finger_table):
+                total += 1
+                right += finger['node_id'] == self.owner(ids, (node.node_id + 2 ** k) % nodes)
+        return right / total
+
+    def converge(self, max_rounds):
+        """Runs rounds until the ring is consistent. Returns the number of rounds, or None if it never was."""
+        for rounds in range(max_rounds + 1):
+            if self.ring_ok():
+                return rounds
+            self.round()
+        return None
+
+    def lookups(self, count):
+        """Looks up random keys from random live nodes. Returns (hops per lookup, lookups that found the true owner)."""
+        ids, _ = self.oracle()
+        live = self.live_nodes()
+        hops = []
+        correct = 0
+        for _ in range(count):
+            key = self.random.randrange(nodes)
+            start = self.network.hops
+            found = self.random.choice(live).find_successor_iterative(key)
+            hops.append(self.network.hops - start)
+            correct += found is not None and found['node_id'] == self.owner(ids, key)
+        return hops, correct
+
+    def load(self, count):
+        """Stores count keys at their true owners. Returns the number of keys owned by each live host, replicas not counted."""
+        ids, by_id = self.oracle()
+        for i in range(count):
+            key = f"key-{i}"
+            key_hash = hashFunction(key)
+            self.network.deliver(by_id[self.owner(ids, key_hash)], 'put', [key_hash, key, i])
+        counts = []
+        for host in self.live_hosts():
+            owned = 0
+            for node in host.vnodes.values():
+                pred = ids[bisect.bisect_left(ids, node.node_id) - 1]
+                owned += len(host.store.range_hashes(pred, node.node_id))
+            counts.append(owned)
+        return counts
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+def print_hops(label, hops, correct):
+    print(f"{label}: {len(hops)} lookups, hops mean {statistics.mean(hops):.2f} "
+          f"p50 {percentile(hops, 50)} p99 {percentile(hops, 99)}, {correct} correct")
+
+def main(args):
+    # Chord.py logs every change of successor at INFO, which drowns the results at this scale
+    Chord.log.setLevel(logging.INFO if args.verbose else logging.ERROR)
+    Chord.replication_factor = args.replication
+    sim = Simulator(args.vnodes, args.seed)
+    started = time.monotonic()
+    sim.build(args.nodes)
+    print(f"Built {args.nodes} hosts x {args.vnodes} positions in {time.monotonic() - started:.1f}s")
+
+    counts = sim.load(args.keys)
+    mean = statistics.mean(counts)
+    print(f"Keys per host: min {min(counts)} median {statistics.median(counts)} max {max(counts)} "
+          f"(max/mean {max(counts) / mean:.2f})")
+    print_hops("Stable ring", *sim.lookups(args.lookups))
+
+    started = time.monotonic()
+    sim.join(args.join)
+    joined = sim.converge(args.rounds)
+    print(f"Joined {args.join} hosts: ring consistent after {joined} rounds ({time.monotonic() - started:.1f}s), "
+          f"fingers {sim.finger_accuracy():.1%} correct")
+
+    died = sim.fail(args.fail)
+    started = time.monotonic()
+    healed = sim.converge(args.rounds)
+    hops, correct = sim.lookups(args.lookups)
+    print(f"Failed {died} hosts: ring consistent after {healed} rounds ({time.monotonic() - started:.1f}s), "
+          f"fingers {sim.finger_accuracy():.1%} correct")
+    print_hops("After failures", hops, correct)
+    print(f"{sim.network.rpcs} RPCs delivered")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate a ring of Chord.py nodes in one process.")
+    parser.add_argument("--nodes", type=int, default=1000, help="hosts in the initial ring")
+    parser.add_argument("--vnodes", type=int, default=1, help="ring positions per host")
+    parser.add_argument("--keys", type=int, default=10000, help="keys stored before measuring load")
+    parser.add_argument("--lookups", type=int, default=1000, help="lookups per measurement")
+    parser.add_argument("--join", type=int, default=10, help="hosts that join through the protocol")
+    parser.add_argument("--fail", type=float, default=0.05, help="fraction of hosts that crash")
+    parser.add_argument("--rounds", type=int, default=100, help="give up converging after this many rounds")
+    parser.add_argument("--replication", type=int, default=Chord.replication_factor, help="copies of each key")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the nodes' own log lines")
+    main(parser.parse_args())
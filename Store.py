@@ -0,0 +1,311 @@
+import bisect
+import json
+import logging
+import os
+import threading
+
+# Storage engines behind a node's put/get/get_keys. Keys live in buckets addressed by
+# (hash, original key). The engines are not thread-safe; Chord.py calls them under its lock.
+# LogStore also compacts in a background thread, so it guards its file and index with a lock of its own.
+
+log = logging.getLogger("chord")
+
+class MemoryStore:
+    """Keeps every bucket in a dict, with a sorted array of hashes for range scans. Lost on restart."""
+
+    def __init__(self):
+        self.buckets = {}  # hash -> {original key: value}
+        self.hashes = []  # Sorted hashes of the non-empty buckets
+        self.sizes = {}  # hash -> bytes held in its bucket, so range statistics need no reads
+        self.versions = {}  # (hash, original key) -> version of the stored value, if its writer gave one
+
+    def entry_size(self, key, stored):
+        """Bytes of one bucket entry, given what the bucket holds for it."""
+        return len(str(key)) + len(str(stored))
+
+    def resize(self, key_hash, key, old, new):
+        """Updates a bucket's byte count after an entry changed from old to new; None means absent."""
+        delta = (0 if new is None else self.entry_size(key, new)) - (0 if old is None else self.entry_size(key, old))
+        size = self.sizes.get(key_hash, 0) + delta
+        if key_hash in self.buckets:
+            self.sizes[key_hash] = size
+        else:
+            self.sizes.pop(key_hash, None)
+
+    def put(self, key_hash, key, value, version=None):
+        if key_hash not in self.buckets:
+            bisect.insort(self.hashes, key_hash)
+        bucket = self.buckets.setdefault(key_hash, {})
+        old = bucket.get(key)
+        bucket[key] = value
+        self.resize(key_hash, key, old, value)
+        self.set_version(key_hash, key, version)
+
+    def set_version(self, key_hash, key, version):
+        if version is None:
+            self.versions.pop((key_hash, key), None)
+        else:
+            self.versions[(key_hash, key)] = version
+
+    def get(self, key_hash, key, default=None):
+        return self.buckets.get(key_hash, {}).get(key, default)
+
+    def contains(self, key_hash, key):
+        return key in self.buckets.get(key_hash, {})
+
+    def delete(self, key_hash, key):
+        if self.drop(key_hash, key):
+            self.hashes.pop(bisect.bisect_left(self.hashes, key_hash))
+
+    def drop(self, key_hash, key):
+        """Removes a key from its bucket. Returns True if that emptied the bucket; the caller fixes hashes."""
+        bucket = self.buckets.get(key_hash)
+        if bucket is None or key not in bucket:
+            return False
+        old = bucket.pop(key)
+        if not bucket:
+            del self.buckets[key_hash]
+        self.resize(key_hash, key, old, None)
+        self.versions.pop((key_hash, key), None)
+        return not bucket
+
+    def bucket_items(self, key_hash):
+        return list(self.buckets.get(key_hash, {}).items())
+
+    def items(self):
+        """Yields every (hash, key, value) held, in hash order."""
+        for key_hash in list(self.hashes):
+            for key, value in self.bucket_items(key_hash):
+                yield key_hash, key, value
+
+    def spans(self, start, end):
+        """Returns the slices of self.hashes covering the ring interval (start, end], in ring order from start.
+
+        Paged scans resume after the last hash they returned, so the part past start must come first.
+        """
+        lo = bisect.bisect_right(self.hashes, start)
+        hi = bisect.bisect_right(self.hashes, end)
+        if start < end:
+            return [(lo, hi)]
+        # The interval wraps past zero (start == end means the whole ring, and then hi == lo)
+        return [(lo, len(self.hashes)), (0, hi)]
+
+    def range_hashes(self, start, end):
+        """Returns the bucket hashes in the ring interval (start, end] in ring order, without reading any values."""
+        return [key_hash for lo, hi in self.spans(start, end) for key_hash in self.hashes[lo:hi]]
+
+    def scan(self, start, end, limit=None):
+        """Yields the (hash, key, value) entries whose hash lies in (start, end], in ring order, in O(log n + k).
+
+        With a limit, stops at the first bucket boundary at or after that many entries.
+        """
+        count = 0
+        for lo, hi in self.spans(start, end):
+            for key_hash in self.hashes[lo:hi]:
+                if limit is not None and count >= limit:
+                    return
+                for key, value in self.bucket_items(key_hash):
+                    count += 1
+                    yield key_hash, key, value
+
+    def pop_range(self, start, end):
+        """Removes and returns the entries whose hash lies in (start, end]."""
+        spans = self.spans(start, end)
+        entries = list(self.scan(start, end))
+        for key_hash, key, _ in entries:
+            self.drop(key_hash, key)
+        # Delete the later slice first so the earlier one's indices still hold
+        for lo, hi in sorted(spans, reverse=True):
+            del self.hashes[lo:hi]
+        return entries
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def compact(self):
+        pass
+
+    def close(self):
+        pass
+
+class LogStore(MemoryStore):
+    """Append-only log on disk with an in-memory index of record offsets.
+
+    Values stay on disk and are read back with pread, so the index is all that
+    has to fit in RAM. Restarting replays the log to rebuild the index.
+    """
+
+    def __init__(self, path, compact_ratio=1.0, compact_min_bytes=1 << 20, sync=False):
+        super().__init__()  # buckets map hash -> {original key: (offset, length)}
+        self.path = path
+        self.compact_ratio = compact_ratio  # Compact once dead bytes exceed this fraction of live bytes
+        self.compact_min_bytes = compact_min_bytes  # Never bother compacting smaller logs
+        self.sync = sync  # fsync every write instead of leaving it to the OS
+        self.live_bytes = 0
+        self.dead_bytes = 0
+        self.lock = threading.RLock()  # Held by writes, reads and the compactor's swap
+        self.compactor = None  # Background compaction thread, if one is running
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a+b")
+        self.load()
+
+    def load(self):
+        """Rebuilds the index and the versions from the log, dropping a torn record at the end."""
+        self.buckets = {}
+        self.sizes = {}
+        self.versions = {}
+        self.live_bytes = self.dead_bytes = 0
+        self.file.seek(0)
+        offset = 0
+        for line in self.file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash mid-append leaves a partial last record
+                log.warning("Truncating torn record at offset %s in %s", offset, self.path)
+                self.file.truncate(offset)
+                break
+            self.apply(record, offset, len(line))
+            offset += len(line)
+        self.hashes = sorted(self.buckets)
+        self.file.seek(0, os.SEEK_END)
+
+    def apply(self, record, offset, length):
+        old = self.buckets.get(record['h'], {}).get(record['k'])
+        if old is not None:
+            self.live_bytes -= old[1]
+            self.dead_bytes += old[1]
+        if record['op'] == 'put':
+            self.buckets.setdefault(record['h'], {})[record['k']] = (offset, length)
+            self.resize(record['h'], record['k'], old, (offset, length))
+            self.set_version(record['h'], record['k'], record.get('ver'))
+            self.live_bytes += length
+        else:
+            MemoryStore.drop(self, record['h'], record['k'])
+            self.dead_bytes += length
+
+    def append(self, record):
+        line = json.dumps(record).encode() + b"\n"
+        with self.lock:
+            offset = self.file.seek(0, os.SEEK_END)
+            try:
+                self.file.write(line)
+                self.file.flush()
+                if self.sync:
+                    os.fsync(self.file.fileno())
+            except OSError:
+                # Don't leave a partial record for the next append to follow
+                self.file.truncate(offset)
+                raise
+            self.apply(record, offset, len(line))
+
+    def entry_size(self, key, location):
+        # A bucket holds (offset, length) of the record on disk
+        return location[1]
+
+    def read(self, location):
+        offset, length = location
+        return json.loads(os.pread(self.file.fileno(), length, offset))['v']
+
+    def put(self, key_hash, key, value, version=None):
+        record = {'op': 'put', 'h': key_hash, 'k': key, 'v': value}
+        if version is not None:
+            # Kept in the record so a restart knows which copies are already current
+            record['ver'] = version
+        with self.lock:
+            new = key_hash not in self.buckets
+            self.append(record)
+            # Index the hash only once its record is in the log
+            if new:
+                bisect.insort(self.hashes, key_hash)
+        self.maybe_compact()
+
+    def get(self, key_hash, key, default=None):
+        with self.lock:
+            location = self.buckets.get(key_hash, {}).get(key)
+            return default if location is None else self.read(location)
+
+    def delete(self, key_hash, key):
+        super().delete(key_hash, key)
+        self.maybe_compact()
+
+    def drop(self, key_hash, key):
+        if not self.contains(key_hash, key):
+            return False
+        self.append({'op': 'del', 'h': key_hash, 'k': key})
+        return key_hash not in self.buckets
+
+    def bucket_items(self, key_hash):
+        with self.lock:
+            return [(key, self.read(location)) for key, location in self.buckets.get(key_hash, {}).items()]
+
+    def pop_range(self, start, end):
+        entries = super().pop_range(start, end)
+        self.maybe_compact()
+        return entries
+
+    def maybe_compact(self):
+        """Starts a background compaction once enough of the log is dead."""
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        if self.dead_bytes > self.compact_min_bytes and self.dead_bytes > self.live_bytes * self.compact_ratio:
+            self.compactor = threading.Thread(target=self.compact, name="chord-compact", daemon=True)
+            self.compactor.start()
+
+    def compact(self):
+        """Rewrites the log with only live records, then swaps it in atomically.
+
+        The live records are copied without holding the lock, so writes go on meanwhile. Under the lock
+        only the records appended since are copied and the index is pointed at the new offsets.
+        """
+        tmp_path = self.path + ".compact"
+        with self.lock:
+            end = self.file.seek(0, os.SEEK_END)
+            live = [(key_hash, key, location) for key_hash, bucket in self.buckets.items()
+                    for key, location in bucket.items()]
+            old = os.dup(self.file.fileno())  # Stays readable if the log is closed meanwhile
+        moved = {}
+        offset = 0
+        try:
+            with open(tmp_path, "wb") as tmp:
+                # Put records are copied byte for byte; the log is append-only, so none change under us
+                for key_hash, key, (old_offset, length) in live:
+                    tmp.write(os.pread(old, length, old_offset))
+                    moved[(key_hash, key)] = (offset, length)
+                    offset += length
+                tmp.flush()
+                os.fsync(tmp.fileno())
+                with self.lock:
+                    tail = os.pread(old, self.file.seek(0, os.SEEK_END) - end, end)
+                    tmp.write(tail)
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                    os.replace(tmp_path, self.path)
+                    self.file.close()
+                    self.file = open(self.path, "a+b")
+                    for key_hash, bucket in self.buckets.items():
+                        for key, (old_offset, length) in bucket.items():
+                            # Entries written since the snapshot live in the tail, after the copied records
+                            bucket[key] = (old_offset - end + offset, length) if old_offset >= end \
+                                else moved[(key_hash, key)]
+                    self.live_bytes = sum(self.sizes.values())
+                    self.dead_bytes = offset + len(tail) - self.live_bytes
+        except OSError as e:
+            log.warning("Failed to compact %s: %s", self.path, e)
+            return
+        finally:
+            os.close(old)
+        log.info("Compacted %s: %s keys, %s bytes", self.path, len(live), offset)
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.join()
+        self.file.close()
+
+def open_store(engine, path=None):
+    """Creates the storage engine named by engine: "memory" or "log"."""
+    if engine == "memory":
+        return MemoryStore()
+    if engine == "log":
+        return LogStore(path)
+    raise ValueError(f"Unknown storage engine: {engine}")
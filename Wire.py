@@ -0,0 +1,290 @@
+import socket
+import struct
+import time
+import xmlrpc.client
+
+# Length-prefixed binary RPC, served on the same port as XML-RPC. A connection that opens
+# with MAGIC speaks this protocol; anything else is handled as HTTP.
+MAGIC = b"CHR1"
+max_frame_size = 64 << 20  # Refuse frames larger than this many bytes
+
+INT64 = struct.Struct(">q")
+DOUBLE = struct.Struct(">d")
+U32 = struct.Struct(">I")
+U16 = struct.Struct(">H")
+NODE_KEYS = {'node_id', 'ip', 'port'}
+
+def encode(obj, out):
+    """Appends the encoding of obj to the bytearray out."""
+    if obj is None:
+        out += b"N"
+    elif obj is True:
+        out += b"T"
+    elif obj is False:
+        out += b"F"
+    elif isinstance(obj, int):
+        if -(1 << 63) <= obj < (1 << 63):
+            out += b"i"
+            out += INT64.pack(obj)
+        else:
+            # Ring IDs are up to 160 bits wide
+            raw = obj.to_bytes(obj.bit_length() // 8 + 1, "big", signed=True)
+            out += b"I"
+            out += U16.pack(len(raw))
+            out += raw
+    elif isinstance(obj, float):
+        out += b"d"
+        out += DOUBLE.pack(obj)
+    elif isinstance(obj, str):
+        raw = obj.encode()
+        out += b"s"
+        out += U32.pack(len(raw))
+        out += raw
+    elif isinstance(obj, bytes):
+        out += b"b"
+        out += U32.pack(len(obj))
+        out += obj
+    elif isinstance(obj, dict):
+        if obj.keys() == NODE_KEYS:
+            # Node references travel on every hop; send them without their key names
+            out += b"P"
+            encode(obj['node_id'], out)
+            encode(obj['ip'], out)
+            encode(obj['port'], out)
+        else:
+            out += b"m"
+            out += U32.pack(len(obj))
+            for key, value in obj.items():
+                encode(key, out)
+                encode(value, out)
+    elif isinstance(obj, (list, tuple)):
+        out += b"l"
+        out += U32.pack(len(obj))
+        for item in obj:
+            encode(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(obj).__name__}")
+    return out
+
+def need(buf, pos, size):
+    """Raises ValueError unless buf holds size more bytes at pos."""
+    if pos + size > len(buf):
+        raise ValueError(f"Truncated value at offset {pos}: {size} bytes needed, {len(buf) - pos} left")
+
+def decode(buf, pos=0):
+    """Decodes one value from buf starting at pos. Returns (value, next position).
+
+    Raises ValueError if the value is truncated or malformed.
+    """
+    need(buf, pos, 1)
+    tag = buf[pos:pos + 1]
+    pos += 1
+    if tag == b"N":
+        return None, pos
+    if tag == b"T":
+        return True, pos
+    if tag == b"F":
+        return False, pos
+    if tag == b"i":
+        need(buf, pos, 8)
+        return INT64.unpack_from(buf, pos)[0], pos + 8
+    if tag == b"I":
+        need(buf, pos, 2)
+        size = U16.unpack_from(buf, pos)[0]
+        pos += 2
+        need(buf, pos, size)
+        return int.from_bytes(buf[pos:pos + size], "big", signed=True), pos + size
+    if tag == b"d":
+        need(buf, pos, 8)
+        return DOUBLE.unpack_from(buf, pos)[0], pos + 8
+    if tag == b"s" or tag == b"b":
+        need(buf, pos, 4)
+        size = U32.unpack_from(buf, pos)[0]
+        pos += 4
+        need(buf, pos, size)
+        raw = bytes(buf[pos:pos + size])
+        return (raw.decode() if tag == b"s" else raw), pos + size
+    if tag == b"P":
+        node_id, pos = decode(buf, pos)
+        ip, pos = decode(buf, pos)
+        port, pos = decode(buf, pos)
+        return {'node_id': node_id, 'ip': ip, 'port': port}, pos
+    if tag == b"l":
+        need(buf, pos, 4)
+        count = U32.unpack_from(buf, pos)[0]
+        pos += 4
+        # Every item takes at least one byte, so a larger count is garbage
+        need(buf, pos, count)
+        items = []
+        for _ in range(count):
+            item, pos = decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == b"m":
+        need(buf, pos, 4)
+        count = U32.unpack_from(buf, pos)[0]
+        pos += 4
+        # Every item takes at least one byte, so a larger count is garbage
+        need(buf, pos, count)
+        result = {}
+        for _ in range(count):
+            key, pos = decode(buf, pos)
+            result[key], pos = decode(buf, pos)
+        return result, pos
+    raise ValueError(f"Unknown tag {tag!r} at offset {pos - 1}")
+
+def loads(buf):
+    """Decodes a whole frame payload. Raises ValueError if it is not exactly one well-formed value."""
+    try:
+        value, pos = decode(memoryview(buf))
+    except RecursionError:
+        raise ValueError("Frame nests too deeply") from None
+    if pos != len(buf):
+        raise ValueError(f"{len(buf) - pos} trailing bytes after frame value")
+    return value
+
+def parse_request(request):
+    """Splits a decoded request into (method, params, target). Raises ValueError if it is malformed."""
+    if not isinstance(request, list) or len(request) not in (2, 3) \
+            or not isinstance(request[0], str) or not isinstance(request[1], list):
+        raise ValueError("Malformed request frame")
+    # A third element names the ring position for multi-node hosts
+    return request[0], request[1], request[2] if len(request) > 2 else None
+
+def write_frame(sock, obj):
+    payload = encode(obj, bytearray())
+    sock.sendall(U32.pack(len(payload)) + payload)
+
+def read_frame(rfile):
+    """Reads one frame. Returns None on a clean end of stream."""
+    header = rfile.read(4)
+    if not header:
+        return None
+    if len(header) < 4:
+        raise ConnectionError("Connection closed mid-frame")
+    size = U32.unpack(header)[0]
+    if size > max_frame_size:
+        raise ValueError(f"Frame of {size} bytes exceeds max_frame_size")
+    payload = rfile.read(size)
+    if len(payload) < size:
+        raise ConnectionError("Connection closed mid-frame")
+    return loads(payload)
+
+class SocketReader:
+    """Reads a socket through its own buffer, so a server can tell whether a request is already waiting."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def read(self, n):
+        """Returns n bytes, or fewer if the peer closed the connection."""
+        while len(self.buffer) < n:
+            chunk = self.sock.recv(max(n - len(self.buffer), 65536))
+            if not chunk:
+                break
+            self.buffer += chunk
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+def peek_magic(sock, timeout):
+    """Tells whether a new connection opens with MAGIC, without consuming anything.
+
+    The peer may send MAGIC across several writes, so this waits until four bytes arrive, the bytes
+    stop matching MAGIC, the peer closes or timeout seconds pass.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        head = sock.recv(len(MAGIC), socket.MSG_PEEK)
+        if len(head) == len(MAGIC) or not head or not MAGIC.startswith(head) or time.monotonic() >= deadline:
+            return head == MAGIC
+        time.sleep(0.001)
+
+def serve_request(sock, reader, dispatch):
+    """Answers one binary request with dispatch(method, params, target). Returns False once the connection should be closed.
+
+    target names the ring position the call is for, or is None. A truncated or malformed frame also
+    closes the connection, since the stream can no longer be resynchronised.
+    """
+    try:
+        request = read_frame(reader)
+        if request is None:
+            return False
+        method, params, target = parse_request(request)
+    except (OSError, ValueError):
+        return False
+    try:
+        reply = ['ok', dispatch(method, params, target)]
+    except xmlrpc.client.Fault as fault:
+        reply = ['fault', fault.faultCode, fault.faultString]
+    except Exception as e:
+        # Same shape as SimpleXMLRPCServer's fault for an unexpected exception
+        reply = ['fault', 1, f"{type(e)}:{e}"]
+    try:
+        write_frame(sock, reply)
+    except OSError:
+        return False
+    return True
+
+class BinaryProxy:
+    """ServerProxy look-alike that speaks the binary protocol over one persistent connection."""
+
+    def __init__(self, host, port, timeout):
+        self._address = (host, int(port))
+        self._timeout = timeout
+        self._sock = None
+        self._rfile = None
+
+    def _connect(self, timeout):
+        self._sock = socket.create_connection(self._address, timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.sendall(MAGIC)
+        self._rfile = self._sock.makefile("rb")
+
+    def _request(self, method, params, target=None, timeout=None):
+        """Sends one call. target names the ring position when the peer hosts several (see AsyncChord.py).
+
+        timeout overrides the proxy's socket timeout for this call only.
+        """
+        timeout = self._timeout if timeout is None else timeout
+        # A reused connection may have been closed by the server's keep-alive timeout; retry once on a fresh one
+        for attempt in (0, 1):
+            reused = self._sock is not None
+            if not reused:
+                self._connect(timeout)
+            try:
+                self._sock.settimeout(timeout)
+                write_frame(self._sock, [method, list(params), target])
+                reply = read_frame(self._rfile)
+                if reply is None:
+                    raise ConnectionError("Connection closed by peer")
+                break
+            except (ConnectionError, BrokenPipeError):
+                self._close()
+                if attempt or not reused:
+                    raise
+            except Exception:
+                self._close()
+                raise
+        if reply[0] == 'fault':
+            raise xmlrpc.client.Fault(reply[1], reply[2])
+        return reply[1]
+
+    def _close(self):
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+        self._sock = None
+        self._rfile = None
+
+    def __call__(self, attr):
+        # Mirrors ServerProxy's proxy("close")() used by the connection pool
+        if attr == "close":
+            return self._close
+        raise AttributeError(attr)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *params: self._request(method, params)
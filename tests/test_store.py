@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import Store
+
+SPACE = 2 ** 16
+
+def make_store(engine, tmp_path):
+    return Store.open_store(engine, str(tmp_path / "store.log"))
+
+def fill(store, count, seed=0):
+    rng = random.Random(seed)
+    hashes = rng.sample(range(SPACE), count)
+    for key_hash in hashes:
+        store.put(key_hash, f"key-{key_hash}", key_hash)
+    return hashes
+
+def in_range(key_hash, start, end):
+    if start < end:
+        return start < key_hash <= end
+    return key_hash > start or key_hash <= end
+
+def page(store, start, end, limit):
+    """Pages through (start, end] the way scan_range and send_range do."""
+    cursor, seen = start, []
+    while cursor is not None:
+        entries = list(store.scan(cursor, end, limit))
+        seen.extend(key_hash for key_hash, _, _ in entries)
+        cursor = None if len(entries) < limit or entries[-1][0] == end else entries[-1][0]
+    return seen
+
+@pytest.mark.parametrize("engine", ["memory", "log"])
+@pytest.mark.parametrize("start, end", [(50000, 20000), (30000, 30000)])
+def test_paging_a_wrapping_range_returns_every_entry(engine, start, end, tmp_path):
+    store = make_store(engine, tmp_path)
+    hashes = fill(store, 1500)
+    seen = page(store, start, end, 100)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == {h for h in hashes if in_range(h, start, end)}
+
+def test_range_hashes_come_in_ring_order_from_start(tmp_path):
+    store = make_store("memory", tmp_path)
+    fill(store, 200)
+    hashes = store.range_hashes(50000, 20000)
+    assert hashes == sorted(h for h in hashes if h > 50000) + sorted(h for h in hashes if h <= 20000)
+
+@pytest.mark.parametrize("engine", ["memory", "log"])
+def test_pop_range_of_a_wrapping_range(engine, tmp_path):
+    store = make_store(engine, tmp_path)
+    hashes = fill(store, 500)
+    popped = store.pop_range(50000, 20000)
+    assert {h for h, _, _ in popped} == {h for h in hashes if in_range(h, 50000, 20000)}
+    assert store.hashes == sorted(h for h in hashes if not in_range(h, 50000, 20000))
+
+def test_log_store_reloads_versions(tmp_path):
+    store = make_store("log", tmp_path)
+    store.put(1, "a", "x", 10)
+    store.put(2, "b", "y", 20)
+    store.put(3, "c", "z")
+    store.delete(2, "b")
+    store.close()
+    reopened = make_store("log", tmp_path)
+    assert reopened.versions == {(1, "a"): 10}
+    assert reopened.get(1, "a") == "x"
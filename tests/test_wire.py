@@ -0,0 +1,60 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import Wire
+
+def dumps(obj):
+    return bytes(Wire.encode(obj, bytearray()))
+
+def test_round_trip():
+    value = ['find_successor', [2 ** 150, 'x', b'\x00', 1.5, None, True, {'node_id': 1, 'ip': 'h', 'port': '1'}], {'a': [1]}]
+    assert Wire.loads(dumps(value)) == value
+
+@pytest.mark.parametrize("payload", [
+    dumps(['put', ['key', 'value']])[:-3],  # Truncated string
+    b"s" + Wire.U32.pack(1 << 30) + b"abc",  # String length past the end
+    b"l" + Wire.U32.pack(1 << 31),  # Item count past the end
+    b"i\x00\x01",  # Short integer
+    b"",
+    b"X",
+    dumps(1) + b"N",  # Trailing bytes
+    (b"l" + Wire.U32.pack(1)) * 100000 + b"N",  # Nested too deeply
+])
+def test_malformed_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        Wire.loads(payload)
+
+@pytest.mark.parametrize("request_", [5, [], ['get'], [1, []], ['get', 'key'], ['get', [], None, 'extra']])
+def test_malformed_requests_raise_value_error(request_):
+    with pytest.raises(ValueError):
+        Wire.parse_request(request_)
+
+def test_serve_request_closes_on_a_garbled_frame():
+    server, client = socket.socketpair()
+    payload = b"l" + Wire.U32.pack(3)
+    client.sendall(Wire.U32.pack(len(payload)) + payload)
+    assert Wire.serve_request(server, Wire.SocketReader(server), lambda method, params, target: None) is False
+    server.close()
+    client.close()
+
+def test_peek_magic_waits_for_a_split_magic():
+    server, client = socket.socketpair()
+    client.sendall(Wire.MAGIC[:2])
+    threading.Timer(0.05, client.sendall, (Wire.MAGIC[2:],)).start()
+    assert Wire.peek_magic(server, 2)
+    assert server.recv(4) == Wire.MAGIC  # Nothing was consumed
+    client.close()
+    server.close()
+
+def test_peek_magic_stops_at_http():
+    server, client = socket.socketpair()
+    client.sendall(b"PO")
+    assert not Wire.peek_magic(server, 2)
+    server.close()
+    client.close()